@@ -0,0 +1,107 @@
+"""
+ClearHead Local AI - model backends
+Training recipes selected with ADHDTaskAnalyzer.train_model(backend=...). Each
+fits an sklearn estimator on the raw feature matrix and compiles it into a
+clearhead_forest engine, so scoring never needs sklearn:
+
+  forest     RandomForestClassifier with the analyzer's forest_params (default)
+  hgb        histogram gradient boosting, early-stopped on a validation split
+  logistic   logistic regression on the features plus explicit INTERACTIONS
+  distilled  a 10-tree regression forest fit to a 100-tree forest's out-of-bag probabilities
+"""
+
+import numpy as np
+
+from clearhead_forest import compile_boosting, compile_forest, compile_linear, expand_interactions
+
+HGB_PARAMS = {
+    'max_iter': 300,
+    'learning_rate': 0.1,
+    'max_leaf_nodes': 15,
+    'min_samples_leaf': 20,
+    'l2_regularization': 1.0
+}
+LOGISTIC_C = 1.0
+DISTILL_TEACHER_PARAMS = {'n_estimators': 100, 'max_depth': 12, 'min_samples_split': 5, 'min_samples_leaf': 2}
+DISTILL_STUDENT_PARAMS = {'n_estimators': 10, 'max_depth': 6, 'min_samples_leaf': 5}
+# Product features for the logistic backend. Squares let it bend around the
+# preferred task length, energy and complexity; the priority/category pairs
+# are the ones ADHD_PATTERNS singles out. Adding every pairwise product
+# (147 columns) overfit: holdout AUC 0.79 vs 0.84 with these.
+INTERACTIONS = [
+    ('hour_of_day', 'hour_of_day'),
+    ('task_length_minutes', 'task_length_minutes'),
+    ('energy_level', 'energy_level'),
+    ('task_complexity', 'task_complexity'),
+    ('consecutive_completions', 'consecutive_completions'),
+    ('priority_high', 'category_finance'),
+    ('priority_high', 'category_errands'),
+    ('priority_low', 'category_learning'),
+    ('priority_low', 'category_personal')
+]
+
+
+def interaction_pairs(feature_names, interactions=INTERACTIONS):
+    """INTERACTIONS as (i, j) column indices into feature_names"""
+    index = {name: i for i, name in enumerate(feature_names)}
+    return [(index[a], index[b]) for a, b in interactions]
+
+
+def fit_forest(analyzer, X, y, n_jobs, random_state):
+    """RandomForest on scaled features; the analyzer's scaler is folded into the thresholds"""
+    model = analyzer._new_forest(analyzer.forest_params['n_estimators'], n_jobs, random_state)
+    model.fit(analyzer._scale(X), y)
+    return model, compile_forest(model, analyzer.scaler)
+
+
+def fit_hgb(analyzer, X, y, n_jobs, random_state):
+    """Gradient-boosted trees on raw features (sklearn bins them itself)"""
+    from sklearn.ensemble import HistGradientBoostingClassifier
+
+    model = HistGradientBoostingClassifier(early_stopping=True, class_weight='balanced',
+                                           random_state=random_state, **HGB_PARAMS)
+    model.fit(X, y)
+    return model, compile_boosting(model)
+
+
+def fit_logistic(analyzer, X, y, n_jobs, random_state):
+    """Logistic regression on standardized features and INTERACTIONS products"""
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.preprocessing import StandardScaler
+
+    pairs = np.array(interaction_pairs(analyzer.feature_names), dtype=np.int32)
+    expanded = expand_interactions(X, pairs)
+    scaler = StandardScaler().fit(expanded)
+    model = LogisticRegression(C=LOGISTIC_C, max_iter=2000, class_weight='balanced')
+    model.fit(scaler.transform(expanded), y)
+    return model, compile_linear(model, scaler, pairs)
+
+
+def fit_distilled(analyzer, X, y, n_jobs, random_state):
+    """Small regression forest trained on a large forest's probabilities
+
+    The teacher's out-of-bag probabilities are the targets: unlike in-sample
+    ones they are not memorized labels, so the student learns the smooth
+    completion probability rather than the noise.
+    """
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+    teacher = RandomForestClassifier(oob_score=True, class_weight='balanced', n_jobs=n_jobs,
+                                     random_state=random_state, **DISTILL_TEACHER_PARAMS)
+    teacher.fit(X, y)
+    soft = teacher.oob_decision_function_[:, 1]
+    unseen = np.isnan(soft)  # Rows that were in every bootstrap sample
+    if unseen.any():
+        soft[unseen] = teacher.predict_proba(X[unseen])[:, 1]
+
+    student = RandomForestRegressor(n_jobs=n_jobs, random_state=random_state, **DISTILL_STUDENT_PARAMS)
+    student.fit(X, soft)
+    return student, compile_forest(student)
+
+
+BACKENDS = {
+    'forest': fit_forest,
+    'hgb': fit_hgb,
+    'logistic': fit_logistic,
+    'distilled': fit_distilled
+}
@@ -0,0 +1,225 @@
+"""
+ClearHead Local AI - baked score table
+On the app path every feature except days_since_created takes a handful of
+values, and a few are constants. bake() scores the model once over that grid
+and stores the probabilities as a uint16 array, so scoring an app task is an
+index computation and one gather. Tasks off the grid (an unknown priority,
+values the app never produces) are left to the model.
+
+For tree engines the table is exact up to the uint16 rounding. Values that
+fall between the same pair of split thresholds score the same, so each axis
+keeps one value per such class, and days_since_created is bucketed at the
+trees' own thresholds. Other engines bucket days at DAY_BUCKETS, and
+error_report() measures what that costs.
+"""
+
+import os
+
+import numpy as np
+
+TABLE_FILE = 'baked.npy'
+SCALE = 65535  # Probabilities are stored as round(p * SCALE)
+MAX_BAKED_DAYS = 36500  # Tree engines: days checked for threshold classes
+# Day buckets for other engines (bucket starts). Ending at 730 gave errors up to
+# 0.077 for the logistic backend on 2-10 year old tasks; these keep it under 0.02
+DAY_BUCKETS = [0, 1, 2, 3, 4, 5, 6, 7, 10, 14, 21, 30, 45, 60, 90, 120, 180, 270, 365, 540, 730, 1095, 1825, 3650]
+BAKE_CHUNK_ROWS = 1 << 16
+
+
+class BakedTable:
+    """Probability lookup over the app feature grid
+
+    axes is a list of (column, values, classes): the allowed values of a
+    column (sorted) and the table index of each. dependent maps a column to
+    (source column, expected value for each source value), e.g. the energy
+    level that the app derives from the hour. constants are columns with a
+    single allowed value.
+    """
+
+    def __init__(self, table, axes, day_edges, days_exact, max_days, dependent, constants):
+        self.table = table
+        self.axes = [(column, np.asarray(values, dtype=np.float64), np.asarray(classes, dtype=np.intp))
+                     for column, values, classes in axes]
+        self.day_edges = np.asarray(day_edges, dtype=np.float64)
+        self.days_exact = days_exact
+        self.max_days = float(max_days)
+        self.dependent = {column: (source, np.asarray(expected, dtype=np.float64))
+                          for column, (source, expected) in dependent.items()}
+        self.constants = constants
+        self._flat = table.reshape(-1)
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    def predict(self, columns):
+        """(probabilities, on_grid) for _task_columns output; off-grid probabilities are 0"""
+        n = len(columns['days_since_created'])
+        index = np.zeros(n, dtype=np.intp)
+        on_grid = np.ones(n, dtype=bool)
+        positions = {}
+        for (column, values, classes), size in zip(self.axes, self.table.shape):
+            x = columns[column]
+            position = np.minimum(np.searchsorted(values, x), len(values) - 1)
+            on_grid &= values[position] == x
+            positions[column] = position
+            index = index * size + classes[position]
+
+        days = columns['days_since_created']
+        on_grid &= (days >= 0) & (days <= self.max_days)
+        if self.days_exact:  # Integer days only: thresholds can fall between two days
+            on_grid &= days == np.floor(days)
+        index = index * len(self.day_edges) + np.searchsorted(self.day_edges, days, 'right') - 1
+
+        for column, (source, expected) in self.dependent.items():
+            on_grid &= columns[column] == expected[positions[source]]
+        for column, value in self.constants.items():
+            on_grid &= columns[column] == value
+
+        probabilities = self._flat[np.where(on_grid, index, 0)] / SCALE
+        probabilities[~on_grid] = 0.0
+        return probabilities, on_grid
+
+    def sample_columns(self, n, max_days=3650, rng=0):
+        """n random on-grid rows in _task_columns form, days uniform in [0, max_days]"""
+        rng = np.random.default_rng(rng)
+        columns, positions = {}, {}
+        for column, values, _ in self.axes:
+            positions[column] = rng.integers(len(values), size=n)
+            columns[column] = values[positions[column]]
+        columns['days_since_created'] = rng.integers(max_days + 1, size=n).astype(np.float64)
+        for column, (source, expected) in self.dependent.items():
+            columns[column] = expected[positions[source]]
+        for column, value in self.constants.items():
+            columns[column] = np.full(n, value, dtype=np.float64)
+        return _typed(columns)
+
+    def error_report(self, encode, predict, n=100_000, max_days=3650, rng=0):
+        """Absolute error of the table against predict(encode(columns)) on random grid rows"""
+        columns = self.sample_columns(n, max_days, rng)
+        baked, on_grid = self.predict(columns)
+        error = np.abs(baked - predict(encode(columns)))[on_grid]
+        return {
+            'rows': n,
+            'on_grid': int(on_grid.sum()),
+            'max_abs_error': float(error.max()) if len(error) else 0.0,
+            'mean_abs_error': float(error.mean()) if len(error) else 0.0,
+            'p99_abs_error': float(np.percentile(error, 99)) if len(error) else 0.0,
+            'exact': self.days_exact
+        }
+
+    def info(self):
+        """Manifest entry that load() needs besides the table"""
+        return {
+            'file': TABLE_FILE,
+            'shape': list(self.table.shape),
+            'axes': [[column, values.tolist(), classes.tolist()] for column, values, classes in self.axes],
+            'day_edges': self.day_edges.tolist(),
+            'days_exact': self.days_exact,
+            'max_days': self.max_days if np.isfinite(self.max_days) else None,
+            'dependent': {column: [source, expected.tolist()] for column, (source, expected) in self.dependent.items()},
+            'constants': self.constants
+        }
+
+    def save(self, directory):
+        np.save(os.path.join(directory, TABLE_FILE), np.ascontiguousarray(self.table))
+
+    @classmethod
+    def load(cls, directory, info, mmap_mode='r'):
+        table = np.load(os.path.join(directory, info['file']), mmap_mode=mmap_mode)
+        max_days = np.inf if info['max_days'] is None else info['max_days']
+        return cls(table, info['axes'], info['day_edges'], info['days_exact'], max_days,
+                   {column: tuple(value) for column, value in info['dependent'].items()}, info['constants'])
+
+
+def _typed(columns):
+    """Integer codes for the one-hot columns, float64 for the rest, as _task_columns makes them"""
+    return {column: values.astype(np.intp) if column in ('priority', 'category') else values.astype(np.float64)
+            for column, values in columns.items()}
+
+
+def split_thresholds(engine, n_features):
+    """Sorted split thresholds of each feature, or None for engines without splits"""
+    if not hasattr(engine, 'threshold'):
+        return None
+    internal = engine.children[:, 0] != np.arange(engine.n_nodes)  # Leaves point at themselves
+    return [np.unique(engine.threshold[internal & (engine.feature == f)]) for f in range(n_features)]
+
+
+def _classes(X, thresholds):
+    """Class of each row of X, numbered in order of first appearance
+
+    With thresholds, rows on the same side of every split share a class (a
+    tree goes left when x <= t, so the count of thresholds below x decides).
+    Without, every distinct row is its own class.
+    """
+    if thresholds is None:
+        signature = X
+    else:
+        signature = np.column_stack([np.searchsorted(t, X[:, f].astype(np.float64), 'left')
+                                     for f, t in enumerate(thresholds)])
+    _, first, inverse = np.unique(signature, axis=0, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    renumber = np.empty_like(order)
+    renumber[order] = np.arange(len(order))
+    return renumber[inverse.reshape(-1)], first[order]
+
+
+def bake(encode, predict, axes, dependent, constants, thresholds=None):
+    """Score predict(encode(columns)) over the grid and return a BakedTable
+
+    axes is [(column, allowed values)]; dependent maps a column to (source
+    column, function of the source value); constants maps columns to values.
+    With thresholds (split_thresholds of a tree engine) equivalent values are
+    merged and days are bucketed exactly; without, days use DAY_BUCKETS.
+    """
+    base = {column: values[0] for column, values in axes}
+    base.update(constants)
+
+    def columns_for(varying):
+        """Columns where the given columns vary together and the rest sit at base"""
+        n = len(next(iter(varying.values())))
+        columns = {column: np.full(n, value, dtype=np.float64) for column, value in base.items()}
+        columns['days_since_created'] = np.zeros(n)
+        columns.update((column, np.asarray(values, dtype=np.float64)) for column, values in varying.items())
+        for column, (source, derive) in dependent.items():
+            columns[column] = np.array([derive(value) for value in columns[source]], dtype=np.float64)
+        return _typed(columns)
+
+    baked_axes, representatives = [], []
+    for column, values in axes:
+        values = sorted(values)
+        classes, first = _classes(encode(columns_for({column: values})), thresholds)
+        baked_axes.append((column, values, classes))
+        representatives.append(np.asarray(values, dtype=np.float64)[first])
+
+    if thresholds is not None:
+        days = np.arange(MAX_BAKED_DAYS + 1, dtype=np.float64)
+        classes, first = _classes(encode(columns_for({'days_since_created': days})), thresholds)
+        day_edges = days[first]  # Monotone in days, so each class is one run of days
+        day_values = day_edges
+    else:
+        day_edges = np.asarray(DAY_BUCKETS, dtype=np.float64)
+        upper = np.append(day_edges[1:] - 1, day_edges[-1])
+        day_values = np.expm1((np.log1p(day_edges) + np.log1p(upper)) / 2)  # Midpoint on the model's log scale
+    representatives.append(day_values)
+
+    shape = tuple(len(values) for values in representatives)
+    table = np.empty(int(np.prod(shape)), dtype=np.uint16)
+    grid_columns = [column for column, _ in axes] + ['days_since_created']
+    for start in range(0, len(table), BAKE_CHUNK_ROWS):
+        cells = np.unravel_index(np.arange(start, min(start + BAKE_CHUNK_ROWS, len(table))), shape)
+        columns = columns_for({column: values[cell] for column, values, cell in zip(grid_columns, representatives, cells)})
+        table[start:start + len(cells[0])] = np.rint(predict(encode(columns)) * SCALE)
+
+    sorted_values = {column: values for column, values, _ in baked_axes}  # The order predict() indexes
+    dependent_values = {column: (source, [derive(value) for value in sorted_values[source]])
+                        for column, (source, derive) in dependent.items()}
+    max_days = np.inf
+    if thresholds is not None:
+        # Past the last day checked, days stay in its class unless a threshold lies beyond it
+        last_day, far = encode(columns_for({'days_since_created': [float(MAX_BAKED_DAYS), 1e300]}))
+        if _classes(np.stack([last_day, far]), thresholds)[0][1] != 0:
+            max_days = MAX_BAKED_DAYS
+    return BakedTable(table.reshape(shape), baked_axes, day_edges, thresholds is not None, max_days,
+                      dependent_values, constants)
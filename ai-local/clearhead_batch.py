@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+ClearHead Local AI - batch scoring for many users
+Scores per-user task payloads from a directory, a glob or a JSONL stream with
+one model load per worker and one vectorized prediction per chunk of users.
+
+  python clearhead_batch.py exports/ --output results/
+  python clearhead_batch.py 'exports/*.json' --output results.jsonl --workers 8
+  cat users.jsonl | python clearhead_batch.py - --output results.jsonl
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from collections import deque
+from contextlib import redirect_stdout
+from datetime import datetime
+
+from clearhead_ai import (
+    ADHDTaskAnalyzer, DEFAULT_MODEL_FILE, error_result, load_or_train_model, recommend_many
+)
+from clearhead_io import write_json_atomic
+
+_analyzer = None  # Per-worker model, loaded once by _init_worker
+
+
+def iter_input_chunks(source, users_per_chunk):
+    """Yield chunks of (kind, user_id, item) read lazily from source
+
+    kind is 'file' (item is a path) for directories and globs, or 'line' (item is
+    the raw JSON text) for JSONL files and '-' (stdin). Workers do the parsing.
+    """
+    if source == '-':
+        yield from _chunks(_jsonl_items(sys.stdin), users_per_chunk)
+    elif os.path.isdir(source):
+        paths = (os.path.join(source, name) for name in sorted(os.listdir(source))
+                 if name.endswith('.json'))
+        yield from _chunks((('file', _user_id_from_path(p), p) for p in paths), users_per_chunk)
+    elif os.path.isfile(source):
+        with open(source) as f:
+            yield from _chunks(_jsonl_items(f), users_per_chunk)
+    else:
+        paths = glob.iglob(source)
+        yield from _chunks((('file', _user_id_from_path(p), p) for p in paths), users_per_chunk)
+
+
+def _jsonl_items(lines):
+    for line_number, line in enumerate(lines, 1):
+        if line.strip():
+            yield 'line', str(line_number), line
+
+
+def _user_id_from_path(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _safe_file_name(user_id):
+    return ''.join(c if c.isalnum() or c in '-_.@' else '_' for c in user_id).lstrip('.') or '_'
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _init_worker(model_file):
+    global _analyzer
+    _analyzer = ADHDTaskAnalyzer()
+    with redirect_stdout(sys.stderr):  # stdout may carry results
+        if not _analyzer.load_model(model_file, verify=False):  # The parent already verified it
+            raise FileNotFoundError(model_file)
+
+
+def score_chunk(chunk, current_time, output_dir=None, analyzer=None):
+    """Score one chunk of users with a single model call
+
+    Returns (n_users, n_tasks, n_incomplete, jsonl_lines). With output_dir set,
+    results are written as <user_id>.json files and no lines are returned.
+    """
+    analyzer = analyzer or _analyzer
+    user_ids, payloads, results = [], [], []
+    valid = []  # indices of payloads that parsed
+    for kind, user_id, item in chunk:
+        payload, result = {}, None
+        try:
+            if kind == 'file':
+                with open(item) as f:
+                    payload = json.load(f)
+            else:
+                payload = json.loads(item)
+            if not isinstance(payload, dict):
+                raise ValueError('Expected a JSON object with a "tasks" list')
+            user_id = str(payload.get('userId', payload.get('user_id', user_id)))
+            valid.append(len(payloads))
+        except (OSError, ValueError) as e:
+            payload, result = {}, error_result(e)
+        user_ids.append(user_id)
+        payloads.append(payload)
+        results.append(result)
+
+    scored = recommend_many(analyzer, [payloads[i] for i in valid], datetime.fromisoformat(current_time))
+    for i, result in zip(valid, scored):
+        results[i] = result
+
+    n_tasks = n_incomplete = 0
+    lines = []
+    for user_id, payload, result in zip(user_ids, payloads, results):
+        tasks = payload.get('tasks')
+        if not isinstance(tasks, list):
+            tasks = []  # recommend_many has answered it with an empty or error result
+        n_tasks += len(tasks)
+        n_incomplete += sum(1 for task in tasks if isinstance(task, dict) and not task.get('completed', False))
+        if output_dir:
+            write_json_atomic(os.path.join(output_dir, f'{_safe_file_name(user_id)}.json'), result)
+        else:
+            lines.append(json.dumps(dict(result, userId=user_id), separators=(',', ':')))
+
+    return len(chunk), n_tasks, n_incomplete, lines
+
+
+def run_batch(source, output, model_file=DEFAULT_MODEL_FILE, workers=1, users_per_chunk=500,
+              current_time=None):
+    """Score every user payload in source and write results to output
+
+    output ending in .jsonl (or '-') gets one result line per user, in input
+    order; anything else is treated as a directory of per-user JSON files. At
+    most 2 chunks per worker are in flight, so memory stays bounded however
+    large the input is.
+    """
+    current_time = (current_time or datetime.now()).isoformat()
+    jsonl = output == '-' or output.endswith('.jsonl')
+    output_dir = None if jsonl else output
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    with redirect_stdout(sys.stderr):  # stdout may carry results
+        analyzer = load_or_train_model(model_file)  # Fails fast on an invalid model
+    out = sys.stdout if output == '-' else open(output, 'w') if jsonl else None
+    totals = [0, 0, 0]
+    start = time.perf_counter()
+
+    def collect(stats):
+        for i in range(3):
+            totals[i] += stats[i]
+        if out is not None:
+            for line in stats[3]:
+                out.write(line + '\n')
+
+    try:
+        chunks = iter_input_chunks(source, users_per_chunk)
+        if workers <= 1:
+            for chunk in chunks:
+                collect(score_chunk(chunk, current_time, output_dir, analyzer))
+        else:
+            import multiprocessing
+
+            with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(model_file,)) as pool:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.apply_async(score_chunk, (chunk, current_time, output_dir)))
+                    if len(pending) >= 2 * workers:
+                        collect(pending.popleft().get())
+                while pending:
+                    collect(pending.popleft().get())
+    finally:
+        if out is not None and out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    n_users, n_tasks, n_incomplete = totals
+    summary = {
+        'users': n_users,
+        'tasks': n_tasks,
+        'incomplete_tasks': n_incomplete,
+        'seconds': elapsed,
+        'users_per_second': n_users / elapsed if elapsed else 0.0,
+        'tasks_per_second': n_tasks / elapsed if elapsed else 0.0,
+        'incomplete_tasks_per_second': n_incomplete / elapsed if elapsed else 0.0,
+    }
+    print(f"✅ Scored {n_users} users ({n_incomplete} incomplete of {n_tasks} tasks) in {elapsed:.2f}s: "
+          f"{summary['tasks_per_second']:,.0f} tasks/s, {summary['users_per_second']:,.0f} users/s",
+          file=sys.stderr)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score many users\' task payloads in one sweep')
+    parser.add_argument('input', help='directory of <user>.json files, a glob, a JSONL file, or - for stdin')
+    parser.add_argument('--output', required=True,
+                        help='results directory, or a .jsonl file (- for stdout)')
+    parser.add_argument('--model', default=DEFAULT_MODEL_FILE)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--users-per-chunk', type=int, default=500,
+                        help='users scored together in one model call')
+    args = parser.parse_args(argv)
+
+    run_batch(args.input, args.output, args.model, args.workers, args.users_per_chunk)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1486 @@
+#!/usr/bin/env python3
+"""
+ClearHead Local AI - benchmarks and equivalence checks
+Usage: python clearhead_bench.py <benchmark> [options]
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from clearhead_ai import ADHDTaskAnalyzer, ADHD_PATTERNS, CATEGORIES, PRIORITIES
+
+
+def _timed(fn, *args, **kwargs):
+    """Run fn once and return (result, seconds)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+# ---------------------------------------------------------------------------
+# Training data generation
+# ---------------------------------------------------------------------------
+
+def _legacy_completion_probability(hour, priority, category, task_length, energy_level, task_complexity,
+                                   is_routine, consecutive_completions, patterns):
+    """The original scalar completion probability, kept apart from the vectorized one it checks"""
+    base_prob = 0.5
+    if hour in patterns['hyperfocus_hours']:
+        base_prob += 0.3
+    elif hour in patterns['low_energy_hours']:
+        base_prob -= 0.3
+    base_prob += (energy_level - 5) * 0.08
+    optimal_length = patterns['optimal_task_length']
+    base_prob -= abs(task_length - optimal_length) / optimal_length * 0.4
+    if task_complexity > patterns['complexity_threshold']:
+        base_prob -= (task_complexity - patterns['complexity_threshold']) * 0.1
+    if category in patterns['preferred_categories']:
+        base_prob += 0.2
+    elif category in patterns['avoided_categories']:
+        base_prob -= 0.3
+    if priority == 'high' and category in patterns['avoided_categories']:
+        base_prob -= 0.2
+    elif priority == 'low' and category in patterns['preferred_categories']:
+        base_prob += 0.1
+    if is_routine:
+        base_prob += 0.15
+    base_prob += min(0.3, consecutive_completions * 0.1)
+    return max(0.05, min(0.95, base_prob))
+
+
+def _legacy_generate_adhd_training_data(analyzer, n_samples, seed=42):
+    """Reference per-sample loop generator (the pre-vectorization algorithm)"""
+    np.random.seed(seed)
+    patterns = ADHD_PATTERNS
+    hour_probs = analyzer._get_hour_probabilities(patterns)
+    category_weights = np.array([3.0 if cat in patterns['preferred_categories']
+                                 else 0.5 if cat in patterns['avoided_categories'] else 1.0
+                                 for cat in CATEGORIES])
+    category_probs = category_weights / category_weights.sum()
+    rows = {key: [] for key in ['hour_of_day', 'day_of_week', 'priority', 'category',
+                                'task_length_minutes', 'energy_level', 'task_complexity',
+                                'is_routine', 'days_since_created', 'consecutive_completions',
+                                'time_since_last_completion', 'completed']}
+
+    for _ in range(n_samples):
+        hour = np.random.choice(range(8, 23), p=hour_probs)
+        day = np.random.randint(0, 7)
+        priority = np.random.choice(PRIORITIES, p=[0.2, 0.3, 0.5])
+        category = np.random.choice(CATEGORIES, p=category_probs)
+        task_length = max(5, np.random.normal(patterns['optimal_task_length'], 15))
+        if hour in patterns['hyperfocus_hours']:
+            energy = 5 + np.random.normal(3, 1)
+        elif hour in patterns['low_energy_hours']:
+            energy = 5 + np.random.normal(-2, 1)
+        else:
+            energy = 5 + np.random.normal(0, 1.5)
+        energy_level = max(1, min(10, energy))
+        task_complexity = np.random.uniform(1, 10)
+        is_routine = np.random.choice([0, 1], p=[0.7, 0.3])
+        days_since_created = np.random.exponential(2)
+        consecutive_completions = np.random.poisson(1)
+        time_since_last = np.random.exponential(60)
+        completion_prob = _legacy_completion_probability(
+            hour, priority, category, task_length, energy_level,
+            task_complexity, is_routine, consecutive_completions, patterns
+        )
+
+        for key, value in zip(rows, [hour, day, priority, category, task_length, energy_level,
+                                     task_complexity, is_routine, days_since_created,
+                                     consecutive_completions, time_since_last,
+                                     np.random.random() < completion_prob]):
+            rows[key].append(value)
+
+    return {key: np.asarray(values) for key, values in rows.items()}
+
+
+def bench_datagen(args):
+    """Time the vectorized generator and compare its distributions to the loop version"""
+    from scipy import stats
+
+    analyzer = ADHDTaskAnalyzer()
+
+    legacy, legacy_time = _timed(_legacy_generate_adhd_training_data, analyzer, args.check_samples)
+    fast, fast_time = _timed(analyzer.generate_adhd_training_data, args.check_samples, rng=7)
+    print(f"{args.check_samples} rows: loop {legacy_time:.3f}s, vectorized {fast_time:.4f}s "
+          f"({legacy_time / fast_time:.0f}x)")
+
+    failures = []
+    for column in ['task_length_minutes', 'energy_level', 'task_complexity',
+                   'days_since_created', 'time_since_last_completion']:
+        p = stats.ks_2samp(legacy[column], fast[column].to_numpy()).pvalue
+        print(f"  KS   {column:<28} p={p:.3f}")
+        if p < args.alpha:
+            failures.append(column)
+
+    for column in ['hour_of_day', 'day_of_week', 'priority', 'category', 'is_routine',
+                   'consecutive_completions', 'completed']:
+        values = np.concatenate([legacy[column].astype(str), fast[column].to_numpy().astype(str)])
+        labels, codes = np.unique(values, return_inverse=True)
+        table = np.zeros((2, len(labels)))
+        np.add.at(table, (np.repeat([0, 1], args.check_samples), codes), 1)
+        table = table[:, table.min(axis=0) >= 5]  # chi-square needs populated cells
+        p = stats.chi2_contingency(table).pvalue
+        print(f"  chi2 {column:<28} p={p:.3f}")
+        if p < args.alpha:
+            failures.append(column)
+
+    rng = np.random.default_rng(0)
+    total, elapsed = 0, 0.0
+    for chunk, seconds in _timed_chunks(analyzer.iter_adhd_training_data(args.samples, args.chunk_size, rng)):
+        total += len(chunk)
+        elapsed += seconds
+    print(f"{total} rows in chunks of {args.chunk_size}: {elapsed:.2f}s "
+          f"({total / elapsed:,.0f} rows/s)")
+
+    if failures:
+        print(f"❌ Distribution mismatch: {', '.join(failures)}")
+        return 1
+    print("✅ Distributions match the loop generator")
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# Featurization
+# ---------------------------------------------------------------------------
+
+def _analyzer_tasks(analyzer, n, seed=0):
+    """n analyzer-format task dicts drawn from the synthetic generator"""
+    df = analyzer.generate_adhd_training_data(n, rng=seed)
+    tasks = df.drop(columns='completed').to_dict('records')
+    tasks[0]['priority'] = 'urgent'  # unknown values must encode as all-zero one-hots
+    tasks[-1]['category'] = 'Other'
+    return tasks
+
+
+def bench_features(args):
+    """Check encode_features against prepare_features and time both"""
+    import pandas as pd
+
+    analyzer = ADHDTaskAnalyzer()
+    status = 0
+    for n in args.sizes:
+        tasks = _analyzer_tasks(analyzer, n)
+        expected = analyzer.prepare_features(pd.DataFrame(tasks)).to_numpy(dtype=np.float64)
+        encoded = analyzer.encode_features(tasks)
+        error = float(np.abs(encoded - expected).max())
+
+        reps = max(1, args.repeat // n)
+        _, legacy_time = _timed(lambda: [analyzer.prepare_features(pd.DataFrame(tasks)) for _ in range(reps)])
+        _, fast_time = _timed(lambda: [analyzer.encode_features(tasks) for _ in range(reps)])
+        print(f"{n:>8} tasks: pandas {legacy_time / reps * 1000:8.3f}ms  "
+              f"numpy {fast_time / reps * 1000:8.3f}ms  ({legacy_time / fast_time:5.1f}x)  "
+              f"max |diff| {error:.2e}")
+        if encoded.shape != expected.shape or error > 1e-6:
+            status = 1
+
+    print("✅ encode_features matches prepare_features" if status == 0
+          else "❌ encode_features differs from prepare_features")
+    return status
+
+
+# ---------------------------------------------------------------------------
+# Compiled forest
+# ---------------------------------------------------------------------------
+
+_SKLEARN_FREE_LOAD = """
+import sys, time
+start = time.perf_counter()
+from clearhead_forest import CompiledForest
+import numpy as np
+forest = CompiledForest.load(sys.argv[1], mmap_mode='r')
+p = forest.predict(np.load(sys.argv[2]))
+print(time.perf_counter() - start, any(m.startswith('sklearn') for m in sys.modules), float(p.sum()))
+"""
+
+
+def bench_compiled(args):
+    """Compare the compiled forest with sklearn predict_proba and time both"""
+    import os
+    import subprocess
+    import tempfile
+
+    analyzer = ADHDTaskAnalyzer()
+    analyzer.train_model(analyzer.generate_adhd_training_data(args.train_samples))
+    model, forest = analyzer.model, analyzer.engine
+    print(f"Compiled {forest.n_trees} trees, {forest.n_nodes} nodes, max depth {forest.max_depth}")
+
+    X = analyzer.encode_features(_analyzer_tasks(analyzer, args.check_samples, seed=1))
+    expected = model.predict_proba(analyzer._scale(X))[:, 1]
+    error = float(np.abs(forest.predict(X) - expected).max())
+    print(f"max |diff| vs predict_proba on {len(X)} rows: {error:.2e}")
+
+    for n in args.sizes:
+        batch = X[:n]
+        reps = max(1, args.repeat // n)
+        _, sk_time = _timed(lambda: [model.predict_proba(analyzer._scale(batch)) for _ in range(reps)])
+        _, fast_time = _timed(lambda: [forest.predict(batch) for _ in range(reps)])
+        print(f"{n:>8} rows: sklearn {sk_time / reps * 1000:8.3f}ms  "
+              f"compiled {fast_time / reps * 1000:8.3f}ms  ({sk_time / fast_time:5.1f}x)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        forest.save(tmp)
+        np.save(os.path.join(tmp, 'X.npy'), X[:20])
+        here = os.path.dirname(os.path.abspath(__file__))
+        out = subprocess.run([sys.executable, '-c', _SKLEARN_FREE_LOAD, tmp, os.path.join(tmp, 'X.npy')],
+                             cwd=here, capture_output=True, text=True, check=True).stdout.split()
+        same = abs(float(out[2]) - float(expected[:20].sum())) < 1e-6 * 20
+        print(f"mmap load + score 20 rows in fresh process: {float(out[0]) * 1000:.1f}ms, "
+              f"sklearn imported: {out[1]}, matches: {same}")
+
+    if error > 1e-6 or out[1] != 'False' or not same:
+        print("❌ Compiled forest does not match sklearn")
+        return 1
+    print("✅ Compiled forest matches sklearn predict_proba")
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# Model loading
+# ---------------------------------------------------------------------------
+
+_LOAD_SNIPPET = """
+import sys, time
+start = time.perf_counter()
+from clearhead_bench import rss_mb
+from clearhead_ai import ADHDTaskAnalyzer
+if sys.argv[1] == 'joblib':
+    import joblib
+imported, rss_before = time.perf_counter(), rss_mb()
+if sys.argv[1] == 'joblib':
+    data = joblib.load(sys.argv[2])
+else:
+    ADHDTaskAnalyzer().load_model(sys.argv[2], verify=sys.argv[1] == 'artifact')
+loaded = time.perf_counter()
+print(imported - start, loaded - imported, rss_mb() - rss_before, file=sys.stderr)
+"""
+
+
+def rss_mb(peak=False):
+    """Current (or peak) resident set size of this process in MB
+
+    Reads /proc so the value is per process image; ru_maxrss is inherited across
+    fork and would report the parent's peak in child processes.
+    """
+    key = 'VmHWM:' if peak else 'VmRSS:'
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(key):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def bench_load(args):
+    """Compare model load time and RSS growth: joblib pickle vs memory-mapped artifact"""
+    import os
+    import subprocess
+    import tempfile
+
+    import joblib
+
+    analyzer = ADHDTaskAnalyzer()
+    analyzer.train_model()
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pickle_path = os.path.join(tmp, 'model.joblib')
+        artifact_path = os.path.join(tmp, 'model')
+        joblib.dump({'model': analyzer.model, 'scaler': analyzer.scaler,
+                     'feature_names': analyzer.feature_names}, pickle_path)
+        analyzer.save_model(artifact_path)
+        artifact_bytes = sum(os.path.getsize(os.path.join(artifact_path, f)) for f in os.listdir(artifact_path))
+        print(f"joblib pickle {os.path.getsize(pickle_path) / 1e6:.2f} MB, "
+              f"artifact {artifact_bytes / 1e6:.2f} MB")
+
+        for mode, path in (('joblib', pickle_path), ('artifact', artifact_path), ('artifact-noverify', artifact_path)):
+            runs = []
+            for _ in range(args.repeat):
+                err = subprocess.run([sys.executable, '-c', _LOAD_SNIPPET, mode, path], cwd=here,
+                                     capture_output=True, text=True, check=True).stderr.split()
+                runs.append([float(v) for v in err[-3:]])
+            import_time, load_time, rss = np.median(runs, axis=0)
+            print(f"  {mode:<18} imports {import_time * 1000:7.1f}ms   load {load_time * 1000:7.2f}ms   "
+                  f"RSS growth {rss:5.1f} MB")
+
+        # A loaded artifact saved again (as `history --update` does) must keep its manifest metadata
+        loaded = ADHDTaskAnalyzer()
+        loaded.load_model(artifact_path)
+        resaved_path = os.path.join(tmp, 'resaved')
+        loaded.save_model(resaved_path)
+        resaved = ADHDTaskAnalyzer()
+        resaved.load_model(resaved_path)
+        X = analyzer.encode_features(analyzer.generate_adhd_training_data(1000, rng=1))
+        same = (resaved.manifest['scaler'] is not None
+                and resaved.manifest['scaler'] == analyzer.manifest['scaler']
+                and np.array_equal(resaved.engine.predict(X), analyzer.engine.predict(X)))
+    print("✅ Load/save round trip keeps the scaler and predictions" if same else "❌ Load/save round trip lost metadata")
+    return int(not same)
+
+
+# ---------------------------------------------------------------------------
+# Ranking
+# ---------------------------------------------------------------------------
+
+def _legacy_recommendations(analyzer, tasks, probabilities, current_time):
+    """Reference ranking: reasoning and score for every task, full sort, keep 3"""
+    recommendations = []
+    for i, (task, prob) in enumerate(zip(tasks, probabilities)):
+        recommendations.append({
+            'task_index': i,
+            'completion_probability': float(prob),
+            'reasoning': analyzer._generate_reasoning(task, prob, current_time),
+            'adhd_score': analyzer._calculate_adhd_friendliness(task, current_time)
+        })
+    recommendations.sort(key=lambda x: (x['adhd_score'], x['completion_probability']), reverse=True)
+    return recommendations[:3]
+
+
+def _app_like_tasks(n, rng):
+    """Analyzer tasks with the discrete values the app produces, so ranking ties are common"""
+    return [{
+        'hour_of_day': 10, 'day_of_week': 2,
+        'priority': PRIORITIES[rng.integers(3)],
+        'category': CATEGORIES[rng.integers(len(CATEGORIES))],
+        'task_length_minutes': int(rng.choice([15, 30, 60, 90])),
+        'energy_level': 8,
+        'task_complexity': int(rng.integers(1, 11)),
+        'is_routine': bool(rng.random() < 0.3),
+        'days_since_created': int(rng.integers(0, 30)),
+        'consecutive_completions': 0,
+        'time_since_last_completion': 60,
+    } for _ in range(n)]
+
+
+def bench_ranking(args):
+    """Check top-k ranking against the full-sort loop and time both"""
+    from datetime import datetime
+
+    analyzer = ADHDTaskAnalyzer()
+    rng = np.random.default_rng(0)
+    mismatches = 0
+    for trial in range(args.trials):
+        n = int(rng.integers(1, 60))
+        tasks = _app_like_tasks(n, rng)
+        probabilities = np.round(rng.random(n), 1)  # coarse, so probabilities tie too
+        now = datetime(2026, 1, 5, int(rng.integers(0, 24)))
+        if analyzer.get_task_recommendations(tasks, now, probabilities) != \
+                _legacy_recommendations(analyzer, tasks, probabilities, now):
+            mismatches += 1
+    print(f"{args.trials} random task lists: {mismatches} ranking mismatches")
+
+    now = datetime(2026, 1, 5, 10)
+    for n in args.sizes:
+        tasks = _app_like_tasks(n, rng)
+        probabilities = rng.random(n)
+        reps = max(1, args.repeat // n)
+        _, legacy_time = _timed(lambda: [_legacy_recommendations(analyzer, tasks, probabilities, now)
+                                         for _ in range(reps)])
+        _, fast_time = _timed(lambda: [analyzer.get_task_recommendations(tasks, now, probabilities)
+                                       for _ in range(reps)])
+        print(f"{n:>8} tasks: loop {legacy_time / reps * 1000:8.3f}ms  "
+              f"top-k {fast_time / reps * 1000:8.3f}ms  ({legacy_time / fast_time:5.1f}x)")
+
+    print("✅ Top-k ranking matches the full sort" if mismatches == 0 else "❌ Ranking differs")
+    return int(mismatches > 0)
+
+
+# ---------------------------------------------------------------------------
+# Streaming input
+# ---------------------------------------------------------------------------
+
+_STREAM_SNIPPET = """
+import json, sys, time
+from clearhead_bench import rss_mb
+import clearhead_ai
+analyzer = clearhead_ai.load_or_train_model(sys.argv[3])
+rss_before = rss_mb()
+start = time.perf_counter()
+if sys.argv[1] == 'json.load':
+    with open(sys.argv[2]) as f:
+        result = clearhead_ai.analyze_app_data(analyzer, json.load(f))
+else:
+    with open(sys.argv[2]) as f:
+        result = clearhead_ai.recommend_stream(analyzer, clearhead_ai.iter_json_array(f, 'tasks'))
+print(time.perf_counter() - start, rss_mb(peak=True) - rss_before, result['message'], file=sys.stderr)
+"""
+
+
+def iter_app_tasks(n_tasks, rng, completed_fraction=0.95, now_ms=None):
+    """App-style task dicts created up to 3 years before now_ms (default: now)"""
+    words = ['call', 'email', 'plan', 'budget', 'research', 'clean', 'daily', 'exercise', 'buy',
+             'review', 'presentation', 'design', 'weekly', 'habit', 'groceries', 'report']
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    for i in range(n_tasks):
+        yield {
+            'id': str(i),
+            'text': ' '.join(rng.choice(words, rng.integers(1, 6))),
+            'description': ' '.join(rng.choice(words, rng.integers(0, 20))),
+            'priority': PRIORITIES[rng.integers(3)],
+            'category': CATEGORIES[rng.integers(len(CATEGORIES))],
+            'completed': bool(rng.random() < completed_fraction),
+            'createdAt': now_ms - int(rng.integers(0, 3 * 365 * 86400_000)),
+        }
+
+
+def write_app_export(path, n_tasks, completed_fraction=0.95, seed=0, now_ms=None):
+    """Write an app-style export with n_tasks tasks, most of them completed"""
+    import json
+
+    rng = np.random.default_rng(seed)
+    with open(path, 'w') as f:
+        f.write('{"tasks": [')
+        for i, task in enumerate(iter_app_tasks(n_tasks, rng, completed_fraction, now_ms)):
+            f.write((',' if i else '') + json.dumps(task))
+        f.write(']}')
+
+
+def bench_stream(args):
+    """Peak memory and time: streaming reader vs json.load, across export sizes"""
+    import os
+    import subprocess
+    import tempfile
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        model = os.path.join(tmp, 'model')
+        analyzer = ADHDTaskAnalyzer()
+        analyzer.train_model()
+        analyzer.save_model(model)
+        for n in args.sizes:
+            path = os.path.join(tmp, f'export-{n}.json')
+            write_app_export(path, n)
+            print(f"{n:>9} tasks ({os.path.getsize(path) / 1e6:7.1f} MB)")
+            for mode in ('json.load', 'stream'):
+                err = subprocess.run([sys.executable, '-c', _STREAM_SNIPPET, mode, path, model], cwd=here,
+                                     capture_output=True, text=True, check=True).stderr.split(maxsplit=2)
+                print(f"    {mode:<10} {float(err[0]):7.2f}s   peak RSS growth {float(err[1]):7.1f} MB   {err[2].strip()}")
+            os.unlink(path)
+    return 0
+
+
+_TASKS_SNIPPET = """
+import json, sys, time
+from datetime import datetime
+from clearhead_bench import rss_mb
+import clearhead_ai
+analyzer = clearhead_ai.ADHDTaskAnalyzer()
+analyzer.load_model(sys.argv[3])
+now = datetime.fromisoformat(sys.argv[4])
+with open(sys.argv[2]) as f:
+    tasks = json.load(f)['tasks']
+rss_before = rss_mb()
+start = time.perf_counter()
+if sys.argv[1] == 'dicts':
+    analyzer_tasks = clearhead_ai.build_analyzer_tasks(tasks, now)
+    columns = clearhead_ai._task_columns(analyzer_tasks)
+    recommendations = analyzer.get_task_recommendations(analyzer_tasks, now, analyzer._predict_columns(columns),
+                                                        columns=columns)
+    ids = [analyzer_tasks[rec['task_index']]['original_task']['id'] for rec in recommendations]
+else:
+    batch = clearhead_ai.TaskBatch.from_app_tasks(tasks, now)
+    recommendations = analyzer.get_task_recommendations(batch, now, analyzer._predict_columns(batch.columns))
+    ids = [batch.ids[rec['task_index']] for rec in recommendations]
+print(time.perf_counter() - start, rss_mb(peak=True) - rss_before, json.dumps(ids), file=sys.stderr)
+"""
+
+
+def bench_tasks(args):
+    """TaskBatch vs per-task dicts: identical columns, then peak memory and time from parsed export to top 3"""
+    import os
+    import subprocess
+    import tempfile
+    from datetime import datetime
+
+    from clearhead_ai import TaskBatch, _task_columns, build_analyzer_tasks
+
+    now = datetime(2026, 3, 4, 10, 30)
+    now_ms = int(now.timestamp() * 1000)
+    rng = np.random.default_rng(0)
+    tasks = list(iter_app_tasks(20_000, rng, 0.3, now_ms))
+    odd = [{}, {'id': 'a', 'priority': 'urgent', 'category': 'Hobby'}, {'id': 'b', 'createdAt': now_ms + 86400_000},
+           {'id': 'c', 'completed': True}, {'id': 'd', 'text': 'Daily review', 'priority': 'low', 'completed': False}]
+    tasks[::1000] = odd * (len(tasks[::1000]) // len(odd))
+    expected = _task_columns(build_analyzer_tasks(tasks, now))
+    batch = TaskBatch.from_app_tasks(tasks, now, None)
+    if not all(np.array_equal(expected[name], column) for name, column in batch.columns.items()):
+        print("❌ TaskBatch columns differ from the analyzer dicts")
+        return 1
+    print(f"✅ TaskBatch columns match the analyzer dicts on {len(batch):,} tasks")
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        model = os.path.join(tmp, 'model')
+        analyzer = ADHDTaskAnalyzer()
+        analyzer.train_model()
+        analyzer.save_model(model)
+        status = 0
+        for n in args.sizes:
+            path = os.path.join(tmp, f'export-{n}.json')
+            write_app_export(path, n, completed_fraction=0.0, now_ms=now_ms)
+            print(f"{n:>9} incomplete tasks")
+            winners = {}
+            for mode in ('dicts', 'TaskBatch'):
+                err = subprocess.run([sys.executable, '-c', _TASKS_SNIPPET, mode, path, model, now.isoformat()],
+                                     cwd=here, capture_output=True, text=True, check=True).stderr
+                err = err.strip().splitlines()[-1].split(maxsplit=2)
+                winners[mode] = err[2].strip()
+                print(f"    {mode:<10} {float(err[0]):7.2f}s   peak RSS growth {float(err[1]):7.1f} MB"
+                      f"   ({float(err[1]) * 2**20 / n:5.0f} bytes/task)")
+            if winners['dicts'] != winners['TaskBatch']:
+                print(f"    ❌ different recommendations: {winners}")
+                status = 1
+            os.unlink(path)
+    return status
+
+
+# ---------------------------------------------------------------------------
+# Text heuristics
+# ---------------------------------------------------------------------------
+
+def _random_task_texts(n, rng):
+    """(title, description) pairs built from keyword fragments, overlaps, case and unicode noise"""
+    from clearhead_ai import COMPLEX_KEYWORDS, ROUTINE_KEYWORDS, SIMPLE_KEYWORDS
+
+    fragments = list(COMPLEX_KEYWORDS + SIMPLE_KEYWORDS + ROUTINE_KEYWORDS) + [
+        'analyzemail', 'plancall', 'BUDGET', 'Daily', 'reviewschedule', 'groceries', 'report',
+        'İstanbul', 'straße', 'ΣΟΦΟΣ', '\u212a', 'café', '\t', '\n', '  ', '', 'mom', 'the', 'a']
+    words = lambda k: [fragments[i] for i in rng.integers(len(fragments), size=k)]
+    return [(''.join(w if rng.random() < 0.2 else w + ' ' for w in words(int(rng.integers(0, 8)))),
+             ' '.join(words(int(rng.integers(0, 40)))))
+            for _ in range(n)]
+
+
+def bench_text(args):
+    """Check analyze_task_text against the three heuristics and time both"""
+    from clearhead_ai import (
+        analyze_task_text, estimate_task_complexity, estimate_task_length, is_routine_task
+    )
+
+    def reference(title, description):
+        return (estimate_task_length(title, description), estimate_task_complexity(title, description),
+                is_routine_task(title))
+
+    rng = np.random.default_rng(0)
+    texts = _random_task_texts(args.n, rng)
+    analyze_task_text.cache_clear()
+    mismatches = sum(analyze_task_text.__wrapped__(t, d) != reference(t, d) for t, d in texts)
+    mismatches += sum(analyze_task_text(t, d) != reference(t, d) for t, d in texts)
+    print(f"{args.n} random texts: {mismatches} mismatches")
+
+    # Bulk scoring sees recurring tasks, so draw the timed workload with repeats
+    unique = texts[:max(1, int(args.n * args.unique))]
+    workload = [unique[i] for i in rng.integers(len(unique), size=args.n)]
+    _, reference_time = _timed(lambda: [reference(t, d) for t, d in workload])
+    _, single_time = _timed(lambda: [analyze_task_text.__wrapped__(t, d) for t, d in workload])
+    analyze_task_text.cache_clear()
+    _, cached_time = _timed(lambda: [analyze_task_text(t, d) for t, d in workload])
+    per_task = lambda seconds: seconds / len(workload) * 1e6
+    print(f"{len(workload)} tasks, {len(unique)} distinct texts:")
+    print(f"    three heuristics {per_task(reference_time):6.2f}us/task")
+    print(f"    single pass      {per_task(single_time):6.2f}us/task  ({reference_time / single_time:5.1f}x)")
+    print(f"    single pass+LRU  {per_task(cached_time):6.2f}us/task  ({reference_time / cached_time:5.1f}x)  "
+          f"{analyze_task_text.cache_info()}")
+
+    print("✅ analyze_task_text matches the heuristics" if mismatches == 0 else "❌ Text signals differ")
+    return int(mismatches > 0)
+
+
+# ---------------------------------------------------------------------------
+# Pipeline suite
+# ---------------------------------------------------------------------------
+
+SUITE_STAGES = ['generate', 'prepare_features', 'encode_features', 'train', 'save', 'load',
+                'predict', 'recommend', 'process_cold', 'process_warm', 'process_cached']
+SUITE_SIZES = [1, 20, 1000, 100_000, 1_000_000]
+TRAINING_STAGES = {'train', 'save', 'load'}  # size is the number of training samples
+
+# Each case runs in its own interpreter so peak RSS belongs to that case alone
+_SUITE_SNIPPET = """
+import sys
+from clearhead_bench import run_suite_case
+run_suite_case(*sys.argv[1:])
+"""
+
+# Runs the real CLI (python clearhead_ai.py <in> <out>) and reports the process peak RSS
+_COLD_SNIPPET = """
+import os, runpy, sys
+script, sys.argv, status = sys.argv[1], sys.argv[1:], 0
+sys.path[0] = os.path.dirname(script)  # as when the script is run directly
+try:
+    runpy.run_path(script, run_name='__main__')
+except SystemExit as e:
+    status = e.code
+peak = 0.0
+try:
+    with open('/proc/self/status') as f:
+        peak = next((int(line.split()[1]) / 1024 for line in f if line.startswith('VmHWM:')), 0.0)
+except OSError:
+    pass
+print(peak, file=sys.stderr)
+sys.exit(status)
+"""
+
+
+def _reset_peak_rss():
+    """Reset VmHWM to the current RSS (Linux), so the next peak reading covers only what follows"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _suite_setup(stage, size, workdir):
+    """Prepare inputs for one case and return the callable to time
+
+    The callable may return a peak RSS in MB measured elsewhere (the cold CLI
+    run), which then replaces the in-process reading.
+    """
+    import os
+    import subprocess
+    from datetime import datetime
+
+    from clearhead_ai import DEFAULT_MODEL_FILE, process_clearhead_tasks
+
+    analyzer = ADHDTaskAnalyzer()
+    if stage == 'generate':
+        return lambda: analyzer.generate_adhd_training_data(size)
+    if stage in ('prepare_features', 'encode_features'):
+        df = analyzer.generate_adhd_training_data(size)
+        return lambda: getattr(analyzer, stage)(df)
+    if stage in TRAINING_STAGES:
+        df = analyzer.generate_adhd_training_data(size)
+        if stage == 'train':
+            return lambda: ADHDTaskAnalyzer().train_model(df)
+        analyzer.train_model(df)
+        path = os.path.join(workdir, f'model-{size}')
+        analyzer.save_model(path)
+        if stage == 'save':
+            return lambda: analyzer.save_model(path)
+        return lambda: ADHDTaskAnalyzer().load_model(path)
+
+    model = os.path.join(workdir, DEFAULT_MODEL_FILE)
+    if stage in ('predict', 'recommend'):
+        analyzer.load_model(model)
+        tasks = _analyzer_tasks(analyzer, size)
+        if stage == 'predict':
+            return lambda: analyzer.predict_task_completion(tasks)
+        now = datetime(2026, 1, 5, 10)
+        return lambda: analyzer.get_task_recommendations(tasks, now)
+
+    export = os.path.join(workdir, f'export-{size}.json')
+    if not os.path.exists(export):
+        write_app_export(export, size, completed_fraction=0.0)
+    output = os.path.join(workdir, f'output-{size}.json')
+    # Cold and warm score every repeat (no result cache, no history writes); cache hits are process_cached
+    if stage == 'process_warm':
+        process_clearhead_tasks(export, output, model, cache=None, history=None)  # imports, page and text cache hot
+        return lambda: process_clearhead_tasks(export, output, model, cache=None, history=None)
+    if stage == 'process_cached':
+        cache = os.path.join(workdir, f'cache-{size}.sqlite')
+        process_clearhead_tasks(export, output, model, cache=cache, history=None)  # The miss that fills it
+        return lambda: process_clearhead_tasks(export, output, model, cache=cache, history=None)
+    if stage == 'process_cold':
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'clearhead_ai.py')
+        command = [sys.executable, '-c', _COLD_SNIPPET, script, export, output, '--no-cache', '--no-history']
+        return lambda: float(subprocess.run(command, cwd=workdir, capture_output=True, text=True,
+                                            check=True).stderr.split()[-1])
+    raise ValueError(f"Unknown stage {stage!r}")
+
+
+def run_suite_case(stage, size, workdir, repeat, budget):
+    """Time one (stage, size) case and print its result as a JSON line on stdout
+
+    Runs up to repeat times, stopping early once budget seconds have been spent.
+    """
+    import json
+    from contextlib import redirect_stdout
+
+    size, repeat, budget = int(size), int(repeat), float(budget)
+    times, peak = [], 0.0
+    with redirect_stdout(sys.stderr):  # stdout carries the result
+        fn = _suite_setup(stage, size, workdir)
+        while len(times) < repeat and sum(times) < budget:
+            rss_before = rss_mb()
+            _reset_peak_rss()
+            measured, seconds = _timed(fn)
+            times.append(seconds)
+            peak = max(peak, measured if isinstance(measured, float) else rss_mb(peak=True) - rss_before)
+    times.sort()
+    print(json.dumps({'stage': stage, 'size': size, 'repeats': len(times), 'min_s': times[0],
+                      'median_s': times[len(times) // 2], 'peak_rss_mb': peak}))
+
+
+def _suite_meta():
+    import os
+    import platform
+    import subprocess
+    from datetime import datetime
+
+    import sklearn
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'created_at': datetime.now().isoformat(), 'commit': commit, 'python': platform.python_version(),
+            'numpy': np.__version__, 'sklearn': sklearn.__version__, 'platform': platform.platform(),
+            'cpus': os.cpu_count()}
+
+
+def bench_suite(args):
+    """Time and measure peak RSS of every pipeline stage across task-count sizes"""
+    import json
+    import os
+    import subprocess
+    import tempfile
+    from contextlib import redirect_stdout
+
+    from clearhead_ai import DEFAULT_MODEL_FILE
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    results, failures = [], 0
+    with tempfile.TemporaryDirectory() as workdir:
+        with redirect_stdout(sys.stderr):
+            analyzer = ADHDTaskAnalyzer()
+            analyzer.train_model()
+            analyzer.save_model(os.path.join(workdir, DEFAULT_MODEL_FILE))
+
+        for stage in args.stages:
+            for size in args.sizes:
+                if stage in TRAINING_STAGES and not 20 <= size <= args.max_train_size:
+                    continue
+                proc = subprocess.run([sys.executable, '-c', _SUITE_SNIPPET, stage, str(size), workdir,
+                                       str(args.repeat), str(args.budget)],
+                                      cwd=here, capture_output=True, text=True)
+                if proc.returncode != 0:
+                    failures += 1
+                    reason = (proc.stderr.strip().splitlines() or ['no output'])[-1]
+                    print(f"❌ {stage:<17}{size:>9}  {reason}")
+                    continue
+                result = json.loads(proc.stdout.strip().splitlines()[-1])
+                results.append(result)
+                print(f"{stage:<19}{size:>9}  best {result['min_s'] * 1000:11.3f}ms  "
+                      f"median {result['median_s'] * 1000:11.3f}ms  "
+                      f"peak RSS {result['peak_rss_mb']:8.1f} MB  ({result['repeats']}x)")
+
+    report = {'meta': _suite_meta(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    status = int(failures > 0)
+    if args.baseline:
+        with open(args.baseline) as f:
+            status |= compare_results(json.load(f), report, args.threshold, args.rss_threshold,
+                                      args.min_delta_ms / 1000, args.min_rss_delta_mb)
+    return status
+
+
+def compare_results(baseline, current, threshold=0.2, rss_threshold=0.2, min_delta=0.0005, min_rss_delta=2.0):
+    """Print per-case changes against a baseline report; 1 if any case regressed, else 0
+
+    A case regresses when its best time grows by more than threshold (a fraction)
+    and min_delta seconds, or its peak RSS by more than rss_threshold and
+    min_rss_delta MB. The small absolute floors keep microsecond noise out.
+    """
+    base = {(r['stage'], r['size']): r for r in baseline['results']}
+    regressions = 0
+    for result in current['results']:
+        old = base.get((result['stage'], result['size']))
+        if old is None:
+            continue
+        slower = result['min_s'] > old['min_s'] * (1 + threshold) and result['min_s'] - old['min_s'] > min_delta
+        bigger = (result['peak_rss_mb'] > old['peak_rss_mb'] * (1 + rss_threshold)
+                  and result['peak_rss_mb'] - old['peak_rss_mb'] > min_rss_delta)
+        regressions += slower or bigger
+        time_ratio = result['min_s'] / old['min_s'] if old['min_s'] else float('inf')
+        print(f"{'❌' if slower or bigger else '  '} {result['stage']:<17}{result['size']:>9}  "
+              f"time {time_ratio:6.2f}x{' REGRESSED' if slower else '':<10}  "
+              f"peak RSS {old['peak_rss_mb']:8.1f} -> {result['peak_rss_mb']:8.1f} MB{' REGRESSED' if bigger else ''}")
+
+    if baseline.get('meta', {}).get('platform') != current.get('meta', {}).get('platform'):
+        print("⚠️  Baseline was recorded on a different platform; compare with care")
+    print(f"❌ {regressions} regressed cases" if regressions else "✅ No regressions against the baseline")
+    return int(regressions > 0)
+
+
+def bench_compare(args):
+    """Compare two saved suite reports"""
+    import json
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    return compare_results(baseline, current, args.threshold, args.rss_threshold,
+                           args.min_delta_ms / 1000, args.min_rss_delta_mb)
+
+
+# ---------------------------------------------------------------------------
+# Start-up
+# ---------------------------------------------------------------------------
+
+HEAVY_MODULES = ('numpy', 'pandas', 'sklearn', 'joblib', 'scipy')
+
+
+def _import_profile(command, cwd):
+    """Run command under -X importtime; return {top-level package: cumulative microseconds}
+
+    A package imported underneath another one (numpy under clearhead_forest)
+    is still listed under its own name.
+    """
+    import subprocess
+
+    err = subprocess.run([command[0], '-X', 'importtime'] + command[1:], cwd=cwd,
+                         capture_output=True, text=True).stderr
+    packages = {}
+    for line in err.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if not cumulative.strip().isdigit():
+                continue  # header line
+            package = name.strip().split('.')[0]
+            packages[package] = max(packages.get(package, 0), int(cumulative))
+    return packages
+
+
+def bench_startup(args):
+    """Wall time of short CLI runs per path, and which heavy packages each one imports"""
+    import os
+    import statistics
+    import subprocess
+    import tempfile
+    from contextlib import redirect_stdout
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'clearhead_ai.py')
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        analyzer = ADHDTaskAnalyzer()
+        with redirect_stdout(sys.stderr):
+            analyzer.train_model()
+            analyzer.save_model(os.path.join(tmp, 'clearhead_model'))
+        with open(os.path.join(tmp, 'empty.json'), 'w') as f:
+            f.write('{"tasks": []}')
+        with open(os.path.join(tmp, 'invalid.json'), 'w') as f:
+            f.write('{"tasks": [')
+        write_app_export(os.path.join(tmp, 'tasks.json'), args.tasks, completed_fraction=0.3)
+
+        cases = [('empty', 'empty.json', 'clearhead_model'), ('invalid JSON', 'invalid.json', 'clearhead_model'),
+                 ('missing model', 'tasks.json', 'no_model'), ('inference', 'tasks.json', 'clearhead_model')]
+        for label, input_file, model in cases:
+            command = [sys.executable, script, input_file, 'out.json', '--model', model, '--no-background-train']
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                subprocess.run(command, cwd=tmp, capture_output=True)
+                times.append(time.perf_counter() - start)
+            packages = _import_profile(command, tmp)
+            heavy = [name for name in HEAVY_MODULES if name in packages]
+            median_ms = statistics.median(times) * 1000
+            slowest = sorted(packages.items(), key=lambda item: -item[1])[:3]
+            print(f"{label:<14} median {median_ms:7.1f}ms  best {min(times) * 1000:7.1f}ms  "
+                  f"heavy imports: {', '.join(heavy) or 'none'}")
+            print(f"{'':<14} slowest imports: "
+                  + ', '.join(f'{name} {us / 1000:.1f}ms' for name, us in slowest))
+            if label == 'inference':
+                failed |= median_ms > args.target_ms
+            else:
+                failed |= bool(heavy)
+
+    interpreter = [sys.executable, '-c', 'pass']
+    base = min(_timed(subprocess.run, interpreter)[1] for _ in range(args.repeat)) * 1000
+    print(f"(bare interpreter start: {base:.1f}ms)")
+    print(f"❌ Start-up target of {args.target_ms:.0f}ms missed or a fast path imports heavy packages" if failed
+          else f"✅ Inference under {args.target_ms:.0f}ms and fast paths import nothing heavy")
+    return int(failed)
+
+
+# ---------------------------------------------------------------------------
+# Recommendation cache
+# ---------------------------------------------------------------------------
+
+def bench_cache(args):
+    """Cached vs uncached process_clearhead_tasks: identical results, miss/hit/edit timings"""
+    import json
+    import os
+    import statistics
+    import subprocess
+    import tempfile
+    from contextlib import redirect_stdout
+
+    from clearhead_ai import process_clearhead_tasks
+    from clearhead_cache import RecommendationCache
+
+    def run(name, cache, repeat=1):
+        times = []
+        for _ in range(repeat):
+            with redirect_stdout(sys.stderr):
+                _, seconds = _timed(process_clearhead_tasks, path, os.path.join(tmp, name), model,
+                                    train_missing=False, cache=cache)
+            times.append(seconds)
+        with open(os.path.join(tmp, name)) as f:
+            result = json.load(f)
+        result.pop('timestamp')
+        return result, min(times)
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        model, cache_file = os.path.join(tmp, 'model'), os.path.join(tmp, 'cache.sqlite')
+        cache = RecommendationCache(cache_file)  # kept open, as a long-running caller would
+        with redirect_stdout(sys.stderr):
+            analyzer = ADHDTaskAnalyzer()
+            analyzer.train_model()
+            analyzer.save_model(model)
+        for n in args.sizes:
+            path = os.path.join(tmp, f'tasks-{n}.json')
+            write_app_export(path, n, completed_fraction=0.3, seed=n)
+            expected, plain = run('plain.json', None, args.repeat)
+            missed, miss = run('miss.json', cache)
+            hit_result, hit = run('hit.json', cache, args.repeat)
+
+            # Edit one incomplete task: the result misses but the other rows hit
+            with open(path) as f:
+                data = json.load(f)
+            task = next(task for task in data['tasks'] if not task['completed'])
+            task['priority'] = 'high' if task['priority'] != 'high' else 'low'
+            with open(path, 'w') as f:
+                json.dump(data, f)
+            expected_edit, _ = run('plain-edit.json', None)
+            edited, edit = run('edit.json', cache)
+
+            same = missed == expected and hit_result == expected and edited == expected_edit
+            failed |= not same
+            print(f"{n:>8} tasks: uncached {plain * 1000:9.3f}ms  miss {miss * 1000:9.3f}ms  "
+                  f"hit {hit * 1000:9.3f}ms  one edit {edit * 1000:9.3f}ms  "
+                  f"{'identical' if same else 'RESULTS DIFFER'}")
+
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'clearhead_ai.py')
+        path = os.path.join(tmp, f'tasks-{args.sizes[0]}.json')
+        cache.close()
+        for label, extra in (('uncached', ['--no-cache']), ('cache hit', ['--cache', cache_file])):
+            command = [sys.executable, script, path, os.path.join(tmp, 'cli.json'), '--model', model] + extra
+            times = [_timed(subprocess.run, command, capture_output=True, cwd=tmp)[1] for _ in range(args.repeat)]
+            print(f"CLI {label:<9} ({args.sizes[0]} tasks): median {statistics.median(times) * 1000:7.1f}ms")
+
+        stats = RecommendationCache(cache_file).stats()
+    print(f"cache counters: {stats}")
+    print("❌ Cached results differ" if failed else "✅ Cached results match uncached scoring")
+    return int(failed)
+
+
+# ---------------------------------------------------------------------------
+# Model backends
+# ---------------------------------------------------------------------------
+
+def bench_backends(args):
+    """Accuracy, AUC, model bytes and per-task latency of every model backend"""
+    import os
+    import tempfile
+    from contextlib import redirect_stdout
+
+    from sklearn.metrics import roc_auc_score
+
+    from clearhead_backends import BACKENDS
+
+    analyzer = ADHDTaskAnalyzer()
+    train = analyzer.generate_adhd_training_data(args.train_samples, rng=0)
+    holdout = analyzer.generate_adhd_training_data(args.test_samples, rng=1)
+    X = analyzer.encode_features(holdout)
+    y = holdout['completed'].to_numpy().astype(int)
+
+    failed = False
+    print(f"{'backend':<10} {'accuracy':>8} {'AUC':>7} {'bytes':>10} {'train':>8} "
+          f"{'1 task':>9} {'20 tasks':>9} {'batch/task':>11}  reload")
+    for name in args.backends or BACKENDS:
+        analyzer = ADHDTaskAnalyzer()
+        with redirect_stdout(sys.stderr):
+            _, train_time = _timed(analyzer.train_model, train, backend=name)
+        engine = analyzer.engine
+        p = engine.predict(X)
+
+        def latency(rows):
+            batch = X[:rows]
+            reps = max(1, args.repeat // rows)
+            _, seconds = _timed(lambda: [engine.predict(batch) for _ in range(reps)])
+            return seconds / reps
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'model')
+            with redirect_stdout(sys.stderr):
+                analyzer.save_model(path)
+                loaded = ADHDTaskAnalyzer()
+                loaded.load_model(path)
+            reloaded = loaded.backend == name and np.array_equal(loaded.engine.predict(X), p)
+        failed |= not reloaded
+
+        print(f"{name:<10} {np.mean((p > 0.5) == y):8.3f} {roc_auc_score(y, p):7.3f} {engine.nbytes:>10,} "
+              f"{train_time:7.2f}s {latency(1) * 1e6:7.0f}us {latency(20) * 1e6:7.0f}us "
+              f"{latency(len(X)) / len(X) * 1e6:9.2f}us  {'ok' if reloaded else 'MISMATCH'}")
+
+    if failed:
+        print("❌ A saved model did not reload with its backend and predictions")
+        return 1
+    print("✅ Every backend saves, records its name and reloads identically")
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# Baked score table
+# ---------------------------------------------------------------------------
+
+def bench_baked(args):
+    """Baked table vs the model: error bound, top-3 agreement and scoring time"""
+    import os
+    import tempfile
+    from contextlib import redirect_stdout
+    from datetime import datetime, timedelta
+
+    from clearhead_ai import _task_columns, build_analyzer_tasks
+
+    failed = False
+    rng = np.random.default_rng(0)
+    for backend in args.backends:
+        analyzer = ADHDTaskAnalyzer()
+        with redirect_stdout(sys.stderr):
+            analyzer.train_model(backend=backend)
+            report = analyzer.bake(args.report_rows)
+        print(f"{backend}: {report['bytes'] / 1e6:.1f}MB table {tuple(report['shape'])}, baked in {report['seconds']:.1f}s, "
+              f"|error| max {report['max_abs_error']:.2e} mean {report['mean_abs_error']:.2e} "
+              f"p99 {report['p99_abs_error']:.2e} ({'exact grid' if report['exact'] else 'days bucketed'})")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with redirect_stdout(sys.stderr):
+                analyzer.save_model(os.path.join(tmp, 'model'))
+                baked = ADHDTaskAnalyzer()
+                baked.load_model(os.path.join(tmp, 'model'))
+            table = baked.baked
+
+            # App-shaped requests at every hour of the week
+            agree = 0
+            for trial in range(args.trials):
+                now = datetime(2026, 1, 5) + timedelta(hours=int(rng.integers(24 * 7)))
+                tasks = list(iter_app_tasks(args.tasks, rng, 0.0, int(now.timestamp() * 1000)))
+                columns = _task_columns(build_analyzer_tasks(tasks, now))
+                exact = np.argsort(-baked._predict_model(columns), kind='stable')[:3]
+                looked_up = np.argsort(-baked._predict_baked(columns), kind='stable')[:3]
+                agree += np.array_equal(exact, looked_up)
+            on_grid = table.predict(columns)[1].mean()
+
+            for n in args.sizes:
+                columns = table.sample_columns(n, rng=1)
+                reps = max(1, args.repeat // n)
+                _, model_time = _timed(lambda: [baked._predict_model(columns) for _ in range(reps)])
+                _, table_time = _timed(lambda: [baked._predict_baked(columns) for _ in range(reps)])
+                print(f"  {n:>8} tasks: model {model_time / reps * 1000:8.3f}ms  "
+                      f"baked {table_time / reps * 1000:8.3f}ms  ({model_time / table_time:5.1f}x)")
+        print(f"  same top 3 in {agree}/{args.trials} app requests of {args.tasks} tasks "
+              f"(last request {on_grid:.0%} on the grid)")
+        if report['exact']:
+            failed |= report['max_abs_error'] > 0.5 / 65535 + 1e-12
+
+    if failed:
+        print("❌ An exact table differs from its model by more than the uint16 rounding")
+        return 1
+    print("✅ Tree-engine tables match their models to the uint16 rounding")
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# Model attributions
+# ---------------------------------------------------------------------------
+
+def _reference_path_attributions(forest, x):
+    """Decision-path contributions of one row, walking each tree in Python"""
+    contributions = np.zeros(len(x))
+    for root in forest.roots:
+        node = int(root)
+        while forest.children[node, 0] != node:
+            feature = int(forest.feature[node])
+            child = int(forest.children[node, 1 if x[feature] <= forest.threshold[node] else 0])
+            contributions[feature] += forest.value[child] - forest.value[node]
+            node = child
+    return contributions / forest.n_trees if forest.link == 'mean' else contributions
+
+
+def bench_explain(args):
+    """Attributions per backend: additivity, reference walk, save/load, and latency per explained task"""
+    import os
+    import tempfile
+    from contextlib import redirect_stdout
+    from datetime import datetime
+
+    from clearhead_ai import TaskBatch
+
+    now = datetime(2026, 3, 4, 10, 30)
+    rng = np.random.default_rng(0)
+    batch = TaskBatch.from_app_tasks(list(iter_app_tasks(args.tasks, rng, 0.0, int(now.timestamp() * 1000))), now)
+    failed = False
+    for backend in args.backends:
+        analyzer = ADHDTaskAnalyzer()
+        with redirect_stdout(sys.stderr):
+            analyzer.train_model(backend=backend)
+        X = analyzer._encode_columns(batch.columns)
+        analyzer.explain_columns(batch.take(slice(0, 1)).columns)  # Builds the attributions
+        attributions = analyzer.attributions
+        contributions = attributions.explain(X)
+        score = analyzer.engine.predict(X)
+        if attributions.units == 'log-odds':
+            score = np.log(score / (1 - score))
+        additivity = np.abs(attributions.expected + contributions.sum(axis=1) - score).max()
+        reference = 0.0
+        if hasattr(attributions, 'contribution'):
+            reference = max(np.abs(_reference_path_attributions(analyzer.engine, X[i]) - contributions[i]).max()
+                            for i in range(20))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with redirect_stdout(sys.stderr):
+                analyzer.save_model(os.path.join(tmp, 'model'))
+                loaded = ADHDTaskAnalyzer()
+                loaded.load_model(os.path.join(tmp, 'model'))
+            reloaded = 'attributions' in loaded.manifest and np.array_equal(loaded.attributions.explain(X), contributions)
+
+        timings, worst_ms = [], 0.0
+        for k in (1, 3, 20):
+            top = batch.take(slice(0, k))
+            _, seconds = _timed(lambda: [analyzer.explain_columns(top.columns) for _ in range(args.repeat)])
+            per_task_ms = seconds / args.repeat / k * 1000
+            worst_ms = max(worst_ms, per_task_ms)
+            timings.append(f"{k} tasks {per_task_ms:6.3f}ms/task")
+        print(f"{backend:<10} {attributions.units:<11} |sum - score| {additivity:.1e}  "
+              f"|walk - reference| {reference:.1e}  reload {'ok' if reloaded else 'FAILED'}  {'  '.join(timings)}")
+        failed |= additivity > 1e-9 or reference > 1e-12 or not reloaded or worst_ms > args.budget_ms
+
+    if failed:
+        print(f"❌ Attributions do not add up to the scores, do not reload, or exceed {args.budget_ms}ms per task")
+        return 1
+    print(f"✅ Attributions add up to every backend's scores, reload with the model, "
+          f"and take under {args.budget_ms}ms per task")
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# Out-of-core training
+# ---------------------------------------------------------------------------
+
+_OUT_OF_CORE_SNIPPET = """
+import json, sys, time
+from contextlib import redirect_stdout
+from clearhead_bench import rss_mb
+import clearhead_ai, clearhead_shards
+import sklearn.ensemble, sklearn.metrics, sklearn.model_selection, sklearn.preprocessing
+analyzer = clearhead_ai.ADHDTaskAnalyzer()
+rss_before = rss_mb()
+start = time.perf_counter()
+with redirect_stdout(sys.stderr):
+    if sys.argv[1] == 'in-memory':
+        metrics = analyzer.train_model(clearhead_shards.iter_shards(sys.argv[2]))
+    else:
+        metrics = analyzer.train_out_of_core(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+print(time.perf_counter() - start, rss_mb(peak=True) - rss_before, metrics['test_auc'], file=sys.stderr)
+"""
+
+
+def bench_out_of_core(args):
+    """Peak memory and time of in-memory vs out-of-core training as the data on disk grows"""
+    import os
+    import shutil
+    import subprocess
+    import tempfile
+
+    from clearhead_shards import write_shards
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    print(f"{'rows':>10} {'mode':<12} {'time':>8} {'peak RSS growth':>16} {'AUC':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        data = os.path.join(tmp, 'data')
+        for n in args.sizes:
+            shutil.rmtree(data, ignore_errors=True)
+            write_shards(ADHDTaskAnalyzer().iter_adhd_training_data(n, args.shard_rows, rng=0), data)
+            for mode in ('in-memory', 'out-of-core'):
+                if mode == 'in-memory' and n > args.in_memory_max:
+                    print(f"{n:>10} {mode:<12} {'skipped (--in-memory-max)':>32}")
+                    continue
+                err = subprocess.run([sys.executable, '-c', _OUT_OF_CORE_SNIPPET, mode, data, tmp, str(args.sample_rows)],
+                                     cwd=here, capture_output=True, text=True, check=True).stderr
+                seconds, growth, auc = map(float, err.strip().splitlines()[-1].split())
+                print(f"{n:>10} {mode:<12} {seconds:7.1f}s {growth:13.1f} MB {auc:6.3f}")
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# Scoring server load test
+# ---------------------------------------------------------------------------
+
+SERVER_CONFIGS = {
+    'threads': ['--frontend', 'threads'],
+    'asyncio-unbatched': ['--frontend', 'asyncio', '--max-batch-tasks', '1'],
+    'asyncio': ['--frontend', 'asyncio'],
+    'asyncio-2ms': ['--frontend', 'asyncio', '--max-wait-ms', '2'],
+    'asyncio-process': ['--frontend', 'asyncio', '--executor', 'process', '--workers', '2'],
+}
+
+
+async def _post_requests(socket_path, bodies, n_requests, latencies, responses):
+    """POST n_requests bodies (round robin) on one keep-alive connection"""
+    import asyncio
+
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    try:
+        for i in range(n_requests):
+            body = bodies[i % len(bodies)]
+            start = time.perf_counter()
+            writer.write(b'POST /recommend HTTP/1.1\r\nHost: clearhead\r\nContent-Type: application/json\r\n'
+                         + f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while (line := await reader.readline()) not in (b'\r\n', b''):
+                name, _, value = line.decode().partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+            payload = await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            responses.append((i % len(bodies), status, payload))
+    finally:
+        writer.close()
+
+
+async def _load(socket_path, bodies, clients, n_requests):
+    """(seconds, latencies, responses) of clients connections sharing n_requests"""
+    import asyncio
+
+    latencies, responses = [], []
+    per_client = [n_requests // clients + (i < n_requests % clients) for i in range(clients)]
+    start = time.perf_counter()
+    await asyncio.gather(*(_post_requests(socket_path, bodies, n, latencies, responses) for n in per_client))
+    return time.perf_counter() - start, latencies, responses
+
+
+def _server_health(socket_path):
+    import http.client
+    import json
+    import socket
+
+    class UnixConnection(http.client.HTTPConnection):
+        def connect(self):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(socket_path)
+
+    connection = UnixConnection('clearhead')
+    connection.request('GET', '/health')
+    health = json.loads(connection.getresponse().read())
+    connection.close()
+    return health
+
+
+def bench_server(args):
+    """Throughput and latency of each server front end as concurrent clients grow"""
+    import asyncio
+    import json
+    import os
+    import subprocess
+    import tempfile
+    from contextlib import redirect_stdout
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'clearhead_server.py')
+    rng = np.random.default_rng(0)
+    payloads = [{'tasks': list(iter_app_tasks(args.tasks, rng, 0.0))} for _ in range(args.payloads)]
+    bodies = [json.dumps(payload).encode() for payload in payloads]
+    expected = {}
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        model, socket_path = os.path.join(tmp, 'model'), os.path.join(tmp, 'server.sock')
+        with redirect_stdout(sys.stderr):
+            analyzer = ADHDTaskAnalyzer()
+            analyzer.train_model()
+            analyzer.save_model(model)
+
+        print(f"{os.cpu_count()} CPUs, {args.tasks} tasks per request, {args.requests} requests per level")
+        for name in args.configs:
+            command = [sys.executable, script, '--model', model, '--socket', socket_path] + SERVER_CONFIGS[name]
+            server = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            try:
+                while 'listening' not in server.stdout.readline():
+                    if server.poll() is not None:
+                        raise RuntimeError(f'{name} server exited with {server.returncode}')
+                for clients in args.concurrency:
+                    before = _server_health(socket_path)['metrics']
+                    seconds, latencies, responses = asyncio.run(_load(socket_path, bodies, clients, args.requests))
+                    after = _server_health(socket_path)['metrics']
+
+                    batches = after['batches'] - before['batches']
+                    batched = (after['mean_batch_requests'] * after['batches']
+                               - before['mean_batch_requests'] * before['batches'])
+                    errors = 0
+                    for i, status, payload in responses:
+                        result = json.loads(payload)
+                        recommendations = result.get('recommendations') if status == 200 else None
+                        errors += not result.get('success')
+                        if recommendations is not None:
+                            # Same payload, same answer, whatever else shared its batch
+                            if expected.setdefault(i, recommendations) != recommendations:
+                                errors += 1
+                    failed |= errors > 0
+                    latencies.sort()
+                    print(f"{name:<18} {clients:>4} clients: {len(latencies) / seconds:8.0f} req/s  "
+                          f"p50 {latencies[len(latencies) // 2] * 1000:7.2f}ms  "
+                          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:7.2f}ms  "
+                          f"{batched / max(batches, 1):5.1f} requests/batch"
+                          + (f"  {errors} FAILED" if errors else ""))
+            finally:
+                server.terminate()
+                server.wait()
+
+    print("❌ Some requests failed or got a different answer" if failed
+          else "✅ Every request succeeded with the same answer under every front end and load")
+    return int(failed)
+
+
+def _timed_chunks(iterator):
+    """Yield (item, seconds spent producing it) for each item of iterator"""
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        yield item, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest='benchmark', required=True)
+
+    p = sub.add_parser('datagen', help='training data generator speed and distribution check')
+    p.add_argument('--samples', type=int, default=1_000_000)
+    p.add_argument('--chunk-size', type=int, default=250_000)
+    p.add_argument('--check-samples', type=int, default=20_000)
+    p.add_argument('--alpha', type=float, default=0.001)
+    p.set_defaults(func=bench_datagen)
+
+    p = sub.add_parser('features', help='encode_features vs pandas prepare_features')
+    p.add_argument('--sizes', type=int, nargs='+', default=[1, 20, 1000, 100_000])
+    p.add_argument('--repeat', type=int, default=2000, help='approximate tasks encoded per timing')
+    p.set_defaults(func=bench_features)
+
+    p = sub.add_parser('compiled', help='compiled forest vs sklearn predict_proba')
+    p.add_argument('--train-samples', type=int, default=2000)
+    p.add_argument('--check-samples', type=int, default=100_000)
+    p.add_argument('--sizes', type=int, nargs='+', default=[1, 20, 1000, 100_000])
+    p.add_argument('--repeat', type=int, default=2000, help='approximate rows scored per timing')
+    p.set_defaults(func=bench_compiled)
+
+    p = sub.add_parser('load', help='model load time and RSS: joblib vs artifact')
+    p.add_argument('--repeat', type=int, default=5)
+    p.set_defaults(func=bench_load)
+
+    p = sub.add_parser('ranking', help='top-k ranking vs full-sort loop')
+    p.add_argument('--trials', type=int, default=2000)
+    p.add_argument('--sizes', type=int, nargs='+', default=[20, 200, 2000, 100_000])
+    p.add_argument('--repeat', type=int, default=20_000, help='approximate tasks ranked per timing')
+    p.set_defaults(func=bench_ranking)
+
+    p = sub.add_parser('stream', help='streaming export reader vs json.load memory use')
+    p.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    p.set_defaults(func=bench_stream)
+
+    p = sub.add_parser('tasks', help='TaskBatch columns vs per-task dicts: peak memory and time')
+    p.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    p.set_defaults(func=bench_tasks)
+
+    p = sub.add_parser('text', help='one-pass cached text heuristics vs the per-keyword functions')
+    p.add_argument('--n', type=int, default=200_000)
+    p.add_argument('--unique', type=float, default=0.1, help='fraction of distinct texts in the timed workload')
+    p.set_defaults(func=bench_text)
+
+    p = sub.add_parser('startup', help='CLI wall time and heavy imports per request path')
+    p.add_argument('--tasks', type=int, default=20)
+    p.add_argument('--repeat', type=int, default=10)
+    p.add_argument('--target-ms', type=float, default=150.0, help='inference path budget to first output')
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser('cache', help='recommendation cache: correctness and hit/miss/edit timings')
+    p.add_argument('--sizes', type=int, nargs='+', default=[20, 1000, 100_000])
+    p.add_argument('--repeat', type=int, default=10)
+    p.set_defaults(func=bench_cache)
+
+    p = sub.add_parser('backends', help='accuracy, model size and latency of each model backend')
+    p.add_argument('--backends', nargs='+', help='default: all of clearhead_backends.BACKENDS')
+    p.add_argument('--train-samples', type=int, default=2000)
+    p.add_argument('--test-samples', type=int, default=20_000)
+    p.add_argument('--repeat', type=int, default=20_000, help='approximate rows scored per timing')
+    p.set_defaults(func=bench_backends)
+
+    p = sub.add_parser('baked', help='baked score table: error bound and lookup speed')
+    p.add_argument('--backends', nargs='+', default=['forest', 'logistic'])
+    p.add_argument('--report-rows', type=int, default=100_000)
+    p.add_argument('--trials', type=int, default=500)
+    p.add_argument('--tasks', type=int, default=20)
+    p.add_argument('--sizes', type=int, nargs='+', default=[20, 1000, 100_000])
+    p.add_argument('--repeat', type=int, default=20_000, help='approximate tasks scored per timing')
+    p.set_defaults(func=bench_baked)
+
+    p = sub.add_parser('explain', help='model attributions: additivity, reference check and latency per task')
+    p.add_argument('--backends', nargs='+', default=['forest', 'hgb', 'logistic', 'distilled'])
+    p.add_argument('--tasks', type=int, default=2000)
+    p.add_argument('--repeat', type=int, default=200)
+    p.add_argument('--budget-ms', type=float, default=1.0, help='allowed time per explained task')
+    p.set_defaults(func=bench_explain)
+
+    p = sub.add_parser('outofcore', help='peak memory of in-memory vs out-of-core training by data size')
+    p.add_argument('--sizes', type=int, nargs='+', default=[250_000, 1_000_000, 4_000_000])
+    p.add_argument('--shard-rows', type=int, default=100_000)
+    p.add_argument('--sample-rows', type=int, default=250_000)
+    p.add_argument('--in-memory-max', type=int, default=1_000_000, help='largest size to train in memory')
+    p.set_defaults(func=bench_out_of_core)
+
+    p = sub.add_parser('server', help='scoring server throughput and latency under concurrent clients')
+    p.add_argument('--configs', nargs='+', choices=list(SERVER_CONFIGS), default=list(SERVER_CONFIGS))
+    p.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    p.add_argument('--requests', type=int, default=2000, help='requests per concurrency level')
+    p.add_argument('--tasks', type=int, default=20, help='tasks per request')
+    p.add_argument('--payloads', type=int, default=50, help='distinct request bodies')
+    p.set_defaults(func=bench_server)
+
+    def add_thresholds(p):
+        p.add_argument('--threshold', type=float, default=0.2, help='allowed fractional slowdown')
+        p.add_argument('--rss-threshold', type=float, default=0.2, help='allowed fractional peak RSS growth')
+        p.add_argument('--min-delta-ms', type=float, default=0.5, help='ignore slowdowns smaller than this')
+        p.add_argument('--min-rss-delta-mb', type=float, default=2.0, help='ignore RSS growth smaller than this')
+
+    p = sub.add_parser('suite', help='time and peak RSS of every pipeline stage across sizes')
+    p.add_argument('--stages', nargs='+', choices=SUITE_STAGES, default=SUITE_STAGES)
+    p.add_argument('--sizes', type=int, nargs='+', default=SUITE_SIZES)
+    p.add_argument('--max-train-size', type=int, default=100_000,
+                   help='largest training set for the train/save/load stages')
+    p.add_argument('--repeat', type=int, default=5, help='maximum runs per case')
+    p.add_argument('--budget', type=float, default=2.0, help='stop repeating a case after this many seconds')
+    p.add_argument('--output', help='write the JSON report here')
+    p.add_argument('--baseline', help='compare against this JSON report and fail on regressions')
+    add_thresholds(p)
+    p.set_defaults(func=bench_suite)
+
+    p = sub.add_parser('compare', help='compare two suite reports and fail on regressions')
+    p.add_argument('baseline')
+    p.add_argument('current')
+    add_thresholds(p)
+    p.set_defaults(func=bench_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
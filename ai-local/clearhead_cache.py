@@ -0,0 +1,139 @@
+"""
+ClearHead Local AI - on-disk recommendation cache
+A SQLite file holding finished results (by task-set fingerprint) and the
+completion probability of individual feature rows, both with LRU eviction.
+Reading it needs neither NumPy nor the model.
+"""
+
+import json
+import sqlite3
+import time
+
+from clearhead_profile import count
+
+SQL_BATCH = 500  # keys per IN (...) query, below SQLite's host parameter limit
+TOUCH_SECONDS = 3600  # LRU recency resolution: hits only write when an entry's last use is older
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, result TEXT NOT NULL, last_used REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+CREATE TABLE IF NOT EXISTS rows (key BLOB PRIMARY KEY, probability REAL NOT NULL, last_used REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS rows_last_used ON rows (last_used);
+CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+class RecommendationCache:
+    """Persistent result and row cache
+
+    Lookups that fail on a database error count as misses and failed writes are
+    dropped, so a broken cache file slows requests down but never fails them.
+    Recency is tracked to TOUCH_SECONDS, so repeat hits are read-only. Hit/miss
+    counters are reported to the active clearhead_profile Instrumentation and
+    added to the file's lifetime totals (see stats()) on flush() or close().
+    """
+
+    def __init__(self, path, max_results=1000, max_rows=200_000):
+        self.path = path
+        self.max_results = max_results
+        self.max_rows = max_rows
+        self._pending = {}  # counters not yet written to the stats table
+        self.db = sqlite3.connect(path, timeout=5.0)
+        self.db.execute('PRAGMA journal_mode=WAL')  # Readers do not block the writer
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    def flush(self):
+        """Add the counters recorded since the last flush to the stats table"""
+        pending, self._pending = self._pending, {}
+        try:
+            with self.db:
+                self.db.executemany('INSERT INTO stats VALUES (?, ?) '
+                                    'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+                                    [(name, n) for name, n in pending.items() if n])
+        except sqlite3.Error:
+            pass
+
+    def get_result(self, key):
+        """The cached result dict for key, or None"""
+        try:
+            row = self.db.execute('SELECT result, last_used FROM results WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                self._touch('results', [(key, row[1])])
+        except sqlite3.Error:
+            row = None
+        self._record(cache_hits=int(row is not None), cache_misses=int(row is None))
+        return json.loads(row[0]) if row is not None else None
+
+    def put_result(self, key, result):
+        result_json = json.dumps(result, separators=(',', ':'))
+        try:
+            with self.db:
+                self.db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?)', (key, result_json, time.time()))
+                self._evict('results', self.max_results)
+        except sqlite3.Error:
+            pass
+
+    def get_rows(self, keys):
+        """{key: probability} for the keys that are cached"""
+        found, last_used = {}, []
+        try:
+            for start in range(0, len(keys), SQL_BATCH):
+                batch = keys[start:start + SQL_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                for key, probability, used in self.db.execute(
+                        f'SELECT key, probability, last_used FROM rows WHERE key IN ({placeholders})', batch):
+                    found[key] = probability
+                    last_used.append((key, used))
+            self._touch('rows', last_used)
+        except sqlite3.Error:
+            found = {}
+        self._record(row_cache_hits=len(found), row_cache_misses=len(keys) - len(found))
+        return found
+
+    def put_rows(self, items):
+        """Store (key, probability) pairs"""
+        now = time.time()
+        try:
+            with self.db:
+                self.db.executemany('INSERT OR REPLACE INTO rows VALUES (?, ?, ?)',
+                                    ((key, probability, now) for key, probability in items))
+                self._evict('rows', self.max_rows)
+        except sqlite3.Error:
+            pass
+
+    def _touch(self, table, entries):
+        """Refresh last_used of (key, last_used) entries whose recency is out of date"""
+        now = time.time()
+        stale = [(now, key) for key, used in entries if now - used > TOUCH_SECONDS]
+        if stale:
+            with self.db:
+                self.db.executemany(f'UPDATE {table} SET last_used = ? WHERE key = ?', stale)
+
+    def _evict(self, table, limit):
+        excess = self.db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] - limit
+        if excess > 0:
+            self.db.execute(f'DELETE FROM {table} WHERE key IN '
+                            f'(SELECT key FROM {table} ORDER BY last_used LIMIT ?)', (excess,))
+
+    def _record(self, **counters):
+        for name, n in counters.items():
+            count(name, n)
+            self._pending[name] = self._pending.get(name, 0) + n
+
+    def stats(self):
+        """Lifetime hit/miss counters plus the current number of cached entries"""
+        self.flush()
+        stats = dict(self.db.execute('SELECT name, value FROM stats').fetchall())
+        stats['results'] = self.db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        stats['rows'] = self.db.execute('SELECT COUNT(*) FROM rows').fetchone()[0]
+        return stats
+
+    def clear(self):
+        with self.db:
+            for table in ('results', 'rows', 'stats'):
+                self.db.execute(f'DELETE FROM {table}')
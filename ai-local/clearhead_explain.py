@@ -0,0 +1,128 @@
+"""
+ClearHead Local AI - model attributions
+Splits a compiled model's score for a row into one contribution per encoded
+feature, so reasons can name what the model actually used.
+
+Tree ensembles use decision-path contributions (Saabas): each split a row
+passes moves its prediction from the node's value to the child's, and that
+change is credited to the split feature. The contributions add up exactly to
+the score minus the expected value (the mean root value). The change at every
+node is precomputed and saved with the model, so explaining rows is one walk
+down all trees at once, as in CompiledForest.apply. Linear models credit each
+coefficient times its feature value, splitting an interaction term evenly
+between its two features.
+
+Contributions are in probability units for averaging forests and in log-odds
+for logistic-link engines (boosting, linear).
+"""
+
+import os
+
+import numpy as np
+
+CONTRIBUTIONS_FILE = 'contributions.npy'
+
+
+class PathAttributions:
+    """Decision-path attributions of a CompiledForest
+
+    contribution[node] is value[node] - value[parent], already divided by the
+    number of trees for averaging forests; roots contribute nothing.
+    """
+
+    def __init__(self, forest, contribution, expected):
+        self.forest = forest
+        self.contribution = contribution
+        self.expected = float(expected)
+        self.units = 'probability' if forest.link == 'mean' else 'log-odds'
+
+    @classmethod
+    def build(cls, forest):
+        nodes = np.arange(forest.n_nodes)
+        internal = forest.children[:, 0] != nodes  # Leaves point at themselves
+        if forest.link == 'logistic' and internal.any() and not forest.value[internal].any():
+            raise ValueError("Boosted model has no inner node values; retrain it to explain its scores")
+        parent = nodes.copy()
+        parent[forest.children[internal, 0]] = nodes[internal]
+        parent[forest.children[internal, 1]] = nodes[internal]
+        contribution = forest.value - forest.value[parent]
+        root_values = forest.value[forest.roots]
+        if forest.link == 'mean':
+            contribution /= forest.n_trees
+            expected = root_values.mean()
+        else:
+            expected = forest.bias + root_values.sum()
+        return cls(forest, contribution, expected)
+
+    def explain(self, X):
+        """(n_rows, n_features) contributions for the raw feature matrix X"""
+        forest = self.forest
+        X = np.ascontiguousarray(X)
+        n_rows, n_features = X.shape
+        flat = X.reshape(-1)
+        row_offset = (np.arange(n_rows, dtype=np.int64) * n_features)[:, None]
+        node = np.broadcast_to(forest.roots, (n_rows, len(forest.roots))).copy()
+        contributions = np.zeros(n_rows * n_features)
+        for _ in range(forest.max_depth):
+            cell = row_offset + forest.feature[node]
+            child = forest._next[2 * node + (flat[cell] <= forest.threshold[node])]
+            step = np.where(child != node, self.contribution[child], 0.0)
+            contributions += np.bincount(cell.reshape(-1), weights=step.reshape(-1), minlength=len(contributions))
+            node = child
+        return contributions.reshape(n_rows, n_features)
+
+    def info(self):
+        """Manifest entry that load() needs besides the contributions array"""
+        return {'type': 'path', 'file': CONTRIBUTIONS_FILE, 'expected': self.expected}
+
+    def save(self, directory):
+        np.save(os.path.join(directory, CONTRIBUTIONS_FILE), np.ascontiguousarray(self.contribution))
+
+    @classmethod
+    def load(cls, directory, info, forest, mmap_mode='r'):
+        return cls(forest, np.load(os.path.join(directory, info['file']), mmap_mode=mmap_mode), info['expected'])
+
+
+class LinearAttributions:
+    """Exact attributions of a LinearModel; nothing to precompute or save"""
+
+    units = 'log-odds'
+
+    def __init__(self, model):
+        self.model = model
+        self.expected = model.bias
+
+    def explain(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        n_features = X.shape[1]
+        coef, pairs = self.model.coef, self.model.pairs
+        contributions = X * coef[:n_features]
+        halves = X[:, pairs[:, 0]] * X[:, pairs[:, 1]] * coef[n_features:] / 2
+        for column in (0, 1):
+            np.add.at(contributions, (slice(None), pairs[:, column]), halves)
+        return contributions
+
+    def info(self):
+        return {'type': 'linear'}
+
+    def save(self, directory):
+        pass
+
+
+def build_attributions(engine):
+    """Attributions for a compiled engine, or None if it cannot be explained"""
+    try:
+        if hasattr(engine, 'threshold'):
+            return PathAttributions.build(engine)
+        if hasattr(engine, 'coef'):
+            return LinearAttributions(engine)
+    except ValueError:
+        pass
+    return None
+
+
+def load_attributions(directory, info, engine):
+    """Attributions saved with a model artifact (see info())"""
+    if info['type'] == 'path':
+        return PathAttributions.load(directory, info, engine)
+    return LinearAttributions(engine)
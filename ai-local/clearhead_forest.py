@@ -0,0 +1,432 @@
+"""
+ClearHead Local AI - compiled models
+Flattens fitted sklearn tree ensembles (random forests, gradient boosting) into
+contiguous node arrays, and logistic models into a coefficient vector, and
+scores them with plain NumPy, so inference needs neither sklearn nor pickled
+estimators.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# One uncompressed .npy per node field (struct of arrays) so every field can be
+# memory-mapped and gathered from contiguously
+NODE_FILES = {
+    'feature': np.int32,     # split feature (0 for leaves)
+    'threshold': np.float64,  # go left when x[feature] <= threshold, in raw feature units
+    'children': np.int32,    # (n_nodes, 2) absolute [right, left] child; leaves point at themselves
+    'value': np.float64,     # P(completed) at this node; boosting: raw score, inner nodes the mean of their leaves
+}
+TREE_DTYPE = np.dtype([
+    ('root', np.int32),
+    ('depth', np.int32),
+])
+TREES_FILE = 'trees.npy'
+
+# Model artifact: a directory holding the node arrays plus a JSON manifest
+MANIFEST_FILE = 'manifest.json'
+ARTIFACT_VERSION = 1
+
+
+class CompiledForest:
+    """Array-based tree ensemble
+
+    With link='mean' (random forests) the per-tree leaf probabilities are
+    averaged; with link='logistic' (gradient boosting) the leaf values are
+    summed onto bias and passed through the sigmoid.
+    """
+
+    def __init__(self, feature, threshold, children, value, trees, link='mean', bias=0.0, block_rows=4096):
+        if link not in ('mean', 'logistic'):
+            raise ValueError(f"Unknown link {link!r}")
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.trees = trees
+        self.link = link
+        self.bias = float(bias)
+        self.block_rows = block_rows
+        self._next = children.reshape(-1)  # _next[2 * node + went_left]; a view, not a copy
+        self.roots = np.ascontiguousarray(trees['root'])
+        self.max_depth = int(trees['depth'].max()) if len(trees) else 0
+
+    @property
+    def n_trees(self):
+        return len(self.trees)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        """Size of the node and tree arrays, i.e. of the artifact without its manifest"""
+        return sum(array.nbytes for array in self.arrays().values()) + self.trees.nbytes
+
+    def predict(self, X):
+        """P(completed) for each row of the raw (unscaled) feature matrix X"""
+        X = np.asarray(X)
+        out = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), self.block_rows):
+            block = X[start:start + self.block_rows]
+            leaves = self.value[self.apply(block)]
+            if self.link == 'mean':
+                out[start:start + len(block)] = leaves.mean(axis=1)
+            else:
+                out[start:start + len(block)] = _sigmoid(self.bias + leaves.sum(axis=1))
+        return out
+
+    def predict_proba(self, X):
+        """sklearn-compatible (n, 2) probability matrix"""
+        positive = self.predict(X)
+        return np.column_stack([1.0 - positive, positive])
+
+    def apply(self, X):
+        """Leaf index reached in every tree, shape (n_rows, n_trees), walking all trees at once"""
+        X = np.ascontiguousarray(X)
+        n_rows, n_features = X.shape
+        flat = X.reshape(-1)
+        row_offset = (np.arange(n_rows, dtype=np.int64) * n_features)[:, None]
+        node = np.broadcast_to(self.roots, (n_rows, len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            went_left = flat[row_offset + self.feature[node]] <= self.threshold[node]
+            node = self._next[2 * node + went_left]
+        return node
+
+    def arrays(self):
+        return {'feature': self.feature, 'threshold': self.threshold,
+                'children': self.children, 'value': self.value}
+
+    def info(self):
+        """Manifest entry that load() needs besides the arrays"""
+        return {'type': 'forest', 'link': self.link, 'bias': self.bias}
+
+    def describe(self):
+        return {'n_trees': self.n_trees, 'n_nodes': self.n_nodes, 'max_depth': self.max_depth}
+
+    def save(self, directory):
+        """Write uncompressed node arrays that load() can memory-map"""
+        os.makedirs(directory, exist_ok=True)
+        for name, array in self.arrays().items():
+            np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(array))
+        np.save(os.path.join(directory, TREES_FILE), np.ascontiguousarray(self.trees))
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r', info=None):
+        info = info or {}
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+                  for name in NODE_FILES}
+        trees = np.load(os.path.join(directory, TREES_FILE), mmap_mode=mmap_mode)
+        return cls(trees=trees, link=info.get('link', 'mean'), bias=info.get('bias', 0.0), **arrays)
+
+
+class LinearModel:
+    """Logistic model on the raw features plus products of chosen feature pairs
+
+    P(completed) = sigmoid(bias + [X, X[:, i] * X[:, j] for (i, j) in pairs] @ coef)
+    """
+
+    def __init__(self, coef, pairs, bias):
+        self.coef = coef
+        self.pairs = pairs
+        self.bias = float(bias)
+
+    @property
+    def nbytes(self):
+        return self.coef.nbytes + self.pairs.nbytes
+
+    def predict(self, X):
+        """P(completed) for each row of the raw (unscaled) feature matrix X"""
+        return _sigmoid(self.bias + expand_interactions(X, self.pairs) @ self.coef)
+
+    def predict_proba(self, X):
+        positive = self.predict(X)
+        return np.column_stack([1.0 - positive, positive])
+
+    def arrays(self):
+        return {'coef': self.coef, 'pairs': self.pairs}
+
+    def info(self):
+        return {'type': 'linear', 'bias': self.bias}
+
+    def describe(self):
+        return {'n_coefficients': len(self.coef), 'n_interactions': len(self.pairs)}
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name, array in self.arrays().items():
+            np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(array))
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r', info=None):
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+                  for name in ('coef', 'pairs')}
+        return cls(bias=(info or {})['bias'], **arrays)
+
+
+# Engine classes by the 'type' of a manifest's 'engine' entry
+ENGINES = {'forest': CompiledForest, 'linear': LinearModel}
+
+
+def expand_interactions(X, pairs):
+    """X (as float64) with one product column X[:, i] * X[:, j] appended per (i, j) pair"""
+    X = np.asarray(X, dtype=np.float64)
+    return np.hstack([X, X[:, pairs[:, 0]] * X[:, pairs[:, 1]]])
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+def compile_forest(model, scaler=None):
+    """Flatten a fitted sklearn forest (and optionally its StandardScaler) into a CompiledForest
+
+    Thresholds are mapped back into raw feature units (t * scale + mean), so the
+    compiled forest scores unscaled features directly. A regression forest
+    (e.g. one distilled from classifier probabilities) keeps its leaf means.
+    """
+    classes = getattr(model, 'classes_', None)
+    if classes is not None and len(classes) != 2:
+        raise ValueError("Only binary classifiers can be compiled")
+
+    mean = scale = None
+    if scaler is not None:
+        mean = np.asarray(scaler.mean_, dtype=np.float64)
+        scale = np.asarray(scaler.scale_, dtype=np.float64)
+
+    blocks = {name: [] for name in NODE_FILES}
+    trees = np.zeros(len(model.estimators_), dtype=TREE_DTYPE)
+    offset = 0
+    for i, estimator in enumerate(model.estimators_):
+        tree = estimator.tree_
+        own = np.arange(tree.node_count, dtype=np.int32) + offset
+        is_leaf = tree.children_left < 0
+
+        feature = np.where(is_leaf, 0, tree.feature)
+        threshold = np.where(is_leaf, 0.0, tree.threshold)
+        if scaler is not None:
+            threshold = np.where(is_leaf, 0.0, threshold * scale[feature] + mean[feature])
+
+        blocks['feature'].append(feature)
+        blocks['threshold'].append(threshold)
+        blocks['children'].append(np.column_stack([
+            np.where(is_leaf, own, tree.children_right + offset),
+            np.where(is_leaf, own, tree.children_left + offset),
+        ]))
+        if classes is None:
+            blocks['value'].append(tree.value[:, 0, 0])
+        else:
+            counts = tree.value[:, 0, :]
+            blocks['value'].append(counts[:, 1] / counts.sum(axis=1))
+
+        trees[i] = (offset, tree.max_depth)
+        offset += tree.node_count
+
+    arrays = {name: np.ascontiguousarray(np.concatenate(blocks[name]), dtype=dtype)
+              for name, dtype in NODE_FILES.items()}
+    return CompiledForest(trees=trees, **arrays)
+
+
+def compile_boosting(model):
+    """Flatten a fitted binary HistGradientBoostingClassifier into a logistic-link CompiledForest
+
+    Its trees split raw feature values (x <= num_threshold goes left), and the
+    leaf values already include the learning rate, so the raw score is the
+    baseline plus one leaf value per tree. Inner nodes get the training-count
+    weighted mean of their leaves, which only attributions read. NaN inputs
+    and categorical splits are not supported; encode_features produces neither.
+    """
+    if len(model.classes_) != 2:
+        raise ValueError("Only binary classifiers can be compiled")
+
+    blocks = {name: [] for name in NODE_FILES}
+    predictors = [tree for iteration in model._predictors for tree in iteration]
+    trees = np.zeros(len(predictors), dtype=TREE_DTYPE)
+    offset = 0
+    for i, predictor in enumerate(predictors):
+        nodes = predictor.nodes
+        own = np.arange(len(nodes), dtype=np.int32) + offset
+        is_leaf = nodes['is_leaf'].astype(bool)
+        blocks['feature'].append(np.where(is_leaf, 0, nodes['feature_idx']))
+        blocks['threshold'].append(np.where(is_leaf, 0.0, nodes['num_threshold']))
+        blocks['children'].append(np.column_stack([
+            np.where(is_leaf, own, nodes['right'].astype(np.int64) + offset),
+            np.where(is_leaf, own, nodes['left'].astype(np.int64) + offset),
+        ]))
+        value = np.where(is_leaf, nodes['value'], 0.0)
+        weight = nodes['count'].astype(np.float64)
+        for node in np.flatnonzero(~is_leaf)[::-1]:  # Children are stored after their parent
+            left, right = nodes['left'][node], nodes['right'][node]
+            weight[node] = weight[left] + weight[right]
+            value[node] = (weight[left] * value[left] + weight[right] * value[right]) / weight[node]
+        blocks['value'].append(value)
+        trees[i] = (offset, nodes['depth'].max())
+        offset += len(nodes)
+
+    arrays = {name: np.ascontiguousarray(np.concatenate(blocks[name]), dtype=dtype)
+              for name, dtype in NODE_FILES.items()}
+    bias = float(np.ravel(model._baseline_prediction)[0])
+    return CompiledForest(trees=trees, link='logistic', bias=bias, **arrays)
+
+
+def compile_linear(model, scaler, pairs):
+    """Fold the StandardScaler of the expanded features into a fitted LogisticRegression"""
+    if len(model.classes_) != 2:
+        raise ValueError("Only binary classifiers can be compiled")
+    weights = model.coef_[0] / scaler.scale_
+    bias = float(model.intercept_[0] - np.dot(weights, scaler.mean_))
+    return LinearModel(np.ascontiguousarray(weights, dtype=np.float64),
+                       np.ascontiguousarray(pairs, dtype=np.int32).reshape(-1, 2), bias)
+
+
+def merge_forests(*forests):
+    """Concatenate compiled forests into one ensemble averaging all of their trees"""
+    if any(forest.link != 'mean' for forest in forests):
+        raise ValueError("Only averaging (random) forests can be merged")
+    arrays = {name: [] for name in NODE_FILES}
+    trees = []
+    offset = 0
+    for forest in forests:
+        for name, array in forest.arrays().items():
+            arrays[name].append(array + offset if name == 'children' else array)
+        shifted = np.array(forest.trees, dtype=TREE_DTYPE)
+        shifted['root'] += offset
+        trees.append(shifted)
+        offset += forest.n_nodes
+
+    merged = {name: np.ascontiguousarray(np.concatenate(arrays[name]), dtype=dtype)
+              for name, dtype in NODE_FILES.items()}
+    return CompiledForest(trees=np.concatenate(trees), **merged)
+
+
+def write_artifact(directory, forest, metadata, extras=()):
+    """Write engine arrays plus a manifest (metadata, engine info, per-file sha256, overall checksum)
+
+    extras are more objects with a save(directory) method (e.g. a baked
+    score table) whose files are hashed along with the engine's. The artifact
+    is built in a temporary sibling directory and swapped into place by
+    _replace_directory, so readers never see a half-written or missing model.
+    """
+    import shutil
+    import time
+
+    directory = os.path.abspath(directory)
+    # Not tempfile.mkdtemp: its 0700 would make the model unreadable to a server running as another user
+    tmp = os.path.join(os.path.dirname(directory), f'.tmp-{os.getpid()}-{time.time_ns()}')
+    os.mkdir(tmp)
+    try:
+        forest.save(tmp)
+        for extra in extras:
+            extra.save(tmp)
+        files = {name: {'sha256': _sha256(os.path.join(tmp, name)),
+                        'bytes': os.path.getsize(os.path.join(tmp, name))}
+                 for name in sorted(os.listdir(tmp))}
+        manifest = dict(metadata, schema_version=ARTIFACT_VERSION, engine=forest.info(), files=files,
+                        checksum=_combined_checksum(files))
+        with open(os.path.join(tmp, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        _replace_directory(tmp, directory)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return manifest
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get('schema_version') != ARTIFACT_VERSION:
+        raise ValueError(f"Unsupported model artifact version {manifest.get('schema_version')!r} "
+                         f"(expected {ARTIFACT_VERSION})")
+    return manifest
+
+
+def read_artifact(directory, verify=True):
+    """Open a model artifact; engine arrays are memory-mapped, not read
+
+    With verify=True every file is hashed against the manifest first.
+    """
+    directory = os.path.realpath(directory)  # One version throughout, even if a new one is swapped in
+    manifest = read_manifest(directory)
+    if verify:
+        for name, info in manifest['files'].items():
+            if _sha256(os.path.join(directory, name)) != info['sha256']:
+                raise ValueError(f"Model artifact file {name} does not match its checksum")
+    engine = manifest.get('engine', {'type': 'forest'})  # Artifacts from before engine types were forests
+    if engine['type'] not in ENGINES:
+        raise ValueError(f"Unsupported model engine {engine['type']!r}")
+    return ENGINES[engine['type']].load(directory, mmap_mode='r', info=engine), manifest
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _combined_checksum(files):
+    digest = hashlib.sha256()
+    for name in sorted(files):
+        digest.update(f"{name}:{files[name]['sha256']}\n".encode())
+    return digest.hexdigest()
+
+
+def _replace_directory(src, dst):
+    """Move the finished artifact directory src to dst, atomically where symlinks are available
+
+    dst becomes a symlink to a versioned sibling (.<name>-<time_ns>) and is
+    swapped with one os.replace, so readers find either model and never a
+    missing one. The version it replaced is kept for readers still loading
+    it; older ones are removed. Without symlinks (e.g. Windows without the
+    privilege) dst is a plain directory replaced by two renames.
+    """
+    import shutil
+    import tempfile
+    import time
+
+    parent, name = os.path.split(dst)
+    prefix = f'.{name}-'
+    version = os.path.join(parent, f'{prefix}{time.time_ns()}')
+    link = version + '.link'
+    try:
+        os.symlink(os.path.basename(version), link, target_is_directory=True)
+    except (OSError, NotImplementedError):
+        if not os.path.exists(dst):
+            os.rename(src, dst)
+            return
+        old = tempfile.mkdtemp(prefix='.old-', dir=parent)
+        os.rename(dst, os.path.join(old, 'model'))
+        os.rename(src, dst)
+        shutil.rmtree(old, ignore_errors=True)
+        return
+
+    os.rename(src, version)
+    previous = None
+    if os.path.islink(dst):
+        previous = _version_stamp(os.path.realpath(dst), parent, prefix)
+    elif os.path.isdir(dst):  # A plain directory from before versioning; moved aside once
+        shutil.rmtree(os.path.join(parent, f'{prefix}0'), ignore_errors=True)
+        os.rename(dst, os.path.join(parent, f'{prefix}0'))
+        previous = 0
+    os.replace(link, dst)
+    if previous is None:
+        return
+    for entry in os.listdir(parent):
+        stamp = _version_stamp(os.path.join(parent, entry), parent, prefix)
+        if stamp is not None and stamp < previous:
+            shutil.rmtree(os.path.join(parent, entry), ignore_errors=True)
+
+
+def _version_stamp(path, parent, prefix):
+    """time_ns of a version directory written by _replace_directory, else None"""
+    head, entry = os.path.split(path)
+    stamp = entry[len(prefix):]
+    if os.path.realpath(head) == os.path.realpath(parent) and entry.startswith(prefix) and stamp.isdigit():
+        return int(stamp)
+    return None
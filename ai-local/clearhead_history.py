@@ -0,0 +1,195 @@
+"""
+ClearHead Local AI - per-user completion history
+An append-only SQLite log of task completions and of the recommendations
+that were shown, plus one aggregates row per user (last completion and the
+current streak) that each new completion updates in O(1). momentum() reads
+the live consecutive_completions and time_since_last_completion features
+from that row alone, and labeled_rows() exports the log as training data.
+Reading momentum needs neither NumPy nor the model.
+"""
+
+import sqlite3
+import time
+
+from clearhead_profile import count
+
+DEFAULT_USER = 'local'
+STREAK_GAP_MINUTES = 120  # A completion within this of the previous one extends the streak
+MOMENTUM_RESOLUTION_MINUTES = 15  # time_since_last_completion is rounded to this (stable cache keys)
+MAX_MINUTES_SINCE_COMPLETION = 1440  # and capped here; the model's tanh(t / 480) is flat by then
+OFFER_WINDOW_HOURS = 24  # A recommendation not completed within this is a negative training row
+EXPORT_CHUNK_ROWS = 100_000
+
+# Columns of a logged row: the training data columns (see generate_adhd_training_data)
+ROW_COLUMNS = [
+    'hour_of_day', 'day_of_week', 'priority', 'category', 'task_length_minutes', 'energy_level',
+    'task_complexity', 'is_routine', 'days_since_created', 'consecutive_completions',
+    'time_since_last_completion'
+]
+TEXT_COLUMNS = ('priority', 'category')
+COMPLETED, OFFERED = 1, 0  # events.kind
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    user TEXT NOT NULL, task_id TEXT NOT NULL, time REAL NOT NULL, kind INTEGER NOT NULL,
+    hour_of_day REAL NOT NULL, day_of_week REAL NOT NULL, priority TEXT NOT NULL, category TEXT NOT NULL,
+    task_length_minutes REAL NOT NULL, energy_level REAL NOT NULL, task_complexity REAL NOT NULL,
+    is_routine REAL NOT NULL, days_since_created REAL NOT NULL, consecutive_completions REAL NOT NULL,
+    time_since_last_completion REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_task ON events (user, task_id, kind, time);
+CREATE TABLE IF NOT EXISTS users (
+    user TEXT PRIMARY KEY, last_completion REAL NOT NULL, last_task_id TEXT NOT NULL,
+    streak INTEGER NOT NULL, completions INTEGER NOT NULL
+);
+"""
+_INSERT_EVENT = f"INSERT INTO events VALUES ({','.join('?' * (4 + len(ROW_COLUMNS)))})"
+
+
+def momentum_features(last_completion, streak, now):
+    """(consecutive_completions, time_since_last_completion) at time now (seconds)
+
+    The streak only counts while the last completion is within
+    STREAK_GAP_MINUTES; minutes are rounded and capped so that a feature row
+    (and its cache key) only changes every MOMENTUM_RESOLUTION_MINUTES.
+    """
+    minutes = max(0.0, (now - last_completion) / 60)
+    consecutive = streak if minutes <= STREAK_GAP_MINUTES else 0
+    minutes = round(min(minutes, MAX_MINUTES_SINCE_COMPLETION) / MOMENTUM_RESOLUTION_MINUTES)
+    return consecutive, minutes * MOMENTUM_RESOLUTION_MINUTES
+
+
+class HistoryStore:
+    """Completion and recommendation log with running per-user aggregates
+
+    Completions must arrive in time order per user: add_completions() sorts
+    each batch and skips anything not after the user's last completion, so
+    syncing the same export twice records nothing new.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=5.0)
+        self.db.execute('PRAGMA journal_mode=WAL')  # Readers do not block the writer
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def _aggregates(self, user):
+        """(last_completion, last_task_id, streak, completions), or None before the first completion"""
+        return self.db.execute('SELECT last_completion, last_task_id, streak, completions FROM users WHERE user = ?',
+                               (user,)).fetchone()
+
+    def last_completion(self, user=DEFAULT_USER):
+        """Time (seconds) of the user's latest logged completion, or None"""
+        aggregates = self._aggregates(user)
+        return aggregates[0] if aggregates is not None else None
+
+    def momentum(self, user=DEFAULT_USER, now=None):
+        """momentum_features for the user at now, or None before the first completion"""
+        aggregates = self._aggregates(user)
+        if aggregates is None:
+            return None
+        return momentum_features(aggregates[0], aggregates[2], time.time() if now is None else now)
+
+    def add_completions(self, user, items):
+        """Log (time, task_id, row) completions; returns how many were new
+
+        row holds the task's features at completion time (ROW_COLUMNS; the
+        momentum columns are filled in here from the streak before it).
+        """
+        last, last_task_id, streak, completions = self._aggregates(user) or (float('-inf'), '', 0, 0)
+        # Ids are compared with the stored one, which SQLite hands back as TEXT
+        items = sorted(((completed_at, str(task_id), row) for completed_at, task_id, row in items),
+                       key=lambda item: (item[0], item[1]))
+        events = []
+        for completed_at, task_id, row in items:
+            if (completed_at, task_id) <= (last, last_task_id):
+                continue  # Already logged, or older than the log
+            consecutive, minutes = (momentum_features(last, streak, completed_at) if completions
+                                    else (0, MAX_MINUTES_SINCE_COMPLETION))
+            row = dict(row, consecutive_completions=consecutive, time_since_last_completion=minutes)
+            events.append(_event(user, task_id, completed_at, COMPLETED, row))
+            streak = consecutive + 1
+            last, last_task_id = completed_at, task_id
+            completions += 1
+        if events:
+            with self.db:
+                self.db.executemany(_INSERT_EVENT, events)
+                self.db.execute('INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?, ?)',
+                                (user, last, last_task_id, streak, completions))
+        count('history_completions', len(events))
+        return len(events)
+
+    def add_offers(self, user, now, items):
+        """Log (task_id, row) recommendations shown at time now (seconds)
+
+        A task with an open offer (made within OFFER_WINDOW_HOURS and not
+        completed since) is not logged again, so asking for recommendations
+        repeatedly does not turn one ignored task into many negative rows.
+        """
+        events = [_event(user, task_id, now, OFFERED, row) for task_id, row in items
+                  if not self._offer_open(user, str(task_id), now)]
+        if events:
+            with self.db:
+                self.db.executemany(_INSERT_EVENT, events)
+
+    def _offer_open(self, user, task_id, now):
+        cursor = self.db.execute(f"""
+            SELECT 1 FROM events AS offer
+            WHERE user = :user AND task_id = :task_id AND kind = {OFFERED} AND time > :since AND time <= :now
+              AND NOT EXISTS (SELECT 1 FROM events AS done
+                              WHERE done.user = offer.user AND done.task_id = offer.task_id
+                                AND done.kind = {COMPLETED} AND done.time > offer.time)
+            LIMIT 1
+        """, {'user': user, 'task_id': task_id, 'since': now - OFFER_WINDOW_HOURS * 3600, 'now': now})
+        return cursor.fetchone() is not None
+
+    def labeled_rows(self, user=None, now=None, chunk_size=EXPORT_CHUNK_ROWS):
+        """Yield training data chunks (dicts of NumPy columns plus 'completed')
+
+        Every logged completion is a positive row. A recommendation is a
+        negative row once OFFER_WINDOW_HOURS have passed without that task
+        being completed; those that were completed are already positives.
+        user=None exports every user. The chunks can be passed straight to
+        ADHDTaskAnalyzer.train_model or update_model.
+        """
+        import numpy as np
+
+        now = time.time() if now is None else now
+        columns = ', '.join(ROW_COLUMNS)
+        user_filter = '' if user is None else 'AND user = :user'
+        cursor = self.db.execute(f"""
+            SELECT {columns}, 1 FROM events WHERE kind = {COMPLETED} {user_filter}
+            UNION ALL
+            SELECT {columns}, 0 FROM events AS offer
+            WHERE kind = {OFFERED} AND time <= :cutoff {user_filter}
+              AND NOT EXISTS (SELECT 1 FROM events AS done
+                              WHERE done.user = offer.user AND done.task_id = offer.task_id
+                                AND done.kind = {COMPLETED} AND done.time > offer.time
+                                AND done.time <= offer.time + :window)
+        """, {'user': user, 'cutoff': now - OFFER_WINDOW_HOURS * 3600, 'window': OFFER_WINDOW_HOURS * 3600})
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            values = list(zip(*rows))
+            chunk = {name: np.array(values[i], dtype=str if name in TEXT_COLUMNS else np.float64)
+                     for i, name in enumerate(ROW_COLUMNS)}
+            chunk['completed'] = np.array(values[-1], dtype=bool)
+            yield chunk
+
+    def stats(self, user=None):
+        """Logged completions and recommendations, overall or for one user"""
+        where, params = ('', ()) if user is None else ('WHERE user = ?', (user,))
+        completions, offers = self.db.execute(f'SELECT SUM(kind = {COMPLETED}), SUM(kind = {OFFERED}) '
+                                              f'FROM events {where}', params).fetchone()
+        users = self.db.execute(f'SELECT COUNT(*) FROM users {where}', params).fetchone()[0]
+        return {'users': users, 'completions': completions or 0, 'recommendations': offers or 0}
+
+
+def _event(user, task_id, at, kind, row):
+    return (user, str(task_id), at, kind) + tuple(
+        str(row[name]) if name in TEXT_COLUMNS else float(row[name]) for name in ROW_COLUMNS)
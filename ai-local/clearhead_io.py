@@ -0,0 +1,131 @@
+"""
+ClearHead Local AI - streaming JSON input and atomic output
+Reads the app's task export incrementally so huge exports never have to be
+held in memory, and writes results so readers never see a partial file.
+"""
+
+import itertools
+import json
+import os
+
+_WHITESPACE = ' \t\n\r'
+_NUMBER_CHARS = '0123456789+-.eE'
+_decoder = json.JSONDecoder()
+_tmp_counter = itertools.count()
+
+
+class _StreamBuffer:
+    """Text buffer over a file that refills as the parser consumes it"""
+
+    def __init__(self, f, block_size):
+        self.f = f
+        self.block_size = block_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read another block; returns False at end of file"""
+        if self.eof:
+            return False
+        block = self.f.read(self.block_size)
+        if not block:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + block
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character ('' at end of file)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError(f"Invalid JSON: expected {' or '.join(repr(c) for c in chars)}, "
+                             f"got {char or 'end of file'!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete JSON value, reading more input until it is whole"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # A number cut off by the end of the buffer may continue in the next block
+            # ("-1." decodes as -1), so make sure something other than number characters follows
+            if isinstance(value, (int, float)) and self._runs_to_end(end) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def _runs_to_end(self, end):
+        while end < len(self.buf) and self.buf[end] in _NUMBER_CHARS:
+            end += 1
+        return end == len(self.buf)
+
+
+def iter_json_array(f, key, fields=None, block_size=1 << 16):
+    """Yield the elements of the top-level array f[key] one at a time
+
+    f is a text file containing one JSON object. Other top-level members are
+    decoded whole and stored in the fields dict, if one is given (members after
+    the array are only there once iteration has finished). A missing or null
+    array yields nothing.
+    """
+    stream = _StreamBuffer(f, block_size)
+    stream.expect('{')
+    if stream.peek() == '}':
+        return
+    while True:
+        name = stream.value()
+        stream.expect(':')
+        if name == key and stream.peek() == '[':
+            stream.pos += 1
+            if stream.peek() == ']':
+                stream.pos += 1
+            else:
+                while True:
+                    yield stream.value()
+                    if stream.expect(',]') == ']':
+                        break
+        else:
+            value = stream.value()
+            if name == key:
+                if value:
+                    raise ValueError(f'"{key}" must be a list')
+            elif fields is not None:
+                fields[name] = value
+        if stream.expect(',}') == '}':
+            return
+
+
+def write_json_atomic(path, data):
+    """Write compact JSON to a temporary file next to path, then rename it over path"""
+    # A pid + counter name with O_EXCL instead of tempfile.mkstemp keeps tempfile
+    # (and random, hashlib, shutil) off the start-up path of every CLI run
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp = os.path.join(directory, f'.tmp-{os.getpid()}-{next(_tmp_counter)}.json')
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)  # Mode from the umask, as with open()
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,151 @@
+"""
+ClearHead Local AI - opt-in stage timings and profiling
+Pipeline code marks its stages with stage('name'). They are only timed while
+an Instrumentation is active; otherwise stage() hands back a shared no-op, so
+the disabled cost is one context variable lookup per stage.
+"""
+
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_active = ContextVar('clearhead_instrumentation', default=None)
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('instrumentation', 'name', 'start')
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.instrumentation.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Instrumentation:
+    """Per-stage wall time and call counts plus free-form counters
+
+    One instance can be reused across many runs (the server keeps one for its
+    lifetime); totals accumulate.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+        self.counters = {}
+        self.started = time.perf_counter()
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def add(self, name, seconds):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def as_dict(self):
+        """JSON-ready summary; stages_ms holds the total milliseconds spent in each stage"""
+        # Copy first: another thread may be adding stages while this one reads
+        seconds, calls, counters = dict(self.seconds), dict(self.calls), dict(self.counters)
+        return {
+            'total_ms': (time.perf_counter() - self.started) * 1000,
+            'stages_ms': {name: value * 1000 for name, value in seconds.items()},
+            'stage_calls': calls,
+            'counters': counters
+        }
+
+    def merge(self, summary):
+        """Add the totals of another instance's as_dict() (e.g. from a worker process)"""
+        for name, ms in summary['stages_ms'].items():
+            self.seconds[name] = self.seconds.get(name, 0.0) + ms / 1000
+        for name, n in summary['stage_calls'].items():
+            self.calls[name] = self.calls.get(name, 0) + n
+        for name, n in summary['counters'].items():
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def log_line(self, event='clearhead_timings'):
+        """One structured (JSON) log line"""
+        return json.dumps(dict(self.as_dict(), event=event), separators=(',', ':'))
+
+    def prometheus(self, prefix='clearhead'):
+        """Prometheus text exposition of the stage totals and counters"""
+        seconds, calls, counters = dict(self.seconds), dict(self.calls), dict(self.counters)
+        lines = [f'# TYPE {prefix}_stage_seconds_total counter']
+        lines += [f'{prefix}_stage_seconds_total{{stage="{name}"}} {value:.6f}'
+                  for name, value in sorted(seconds.items())]
+        lines.append(f'# TYPE {prefix}_stage_calls_total counter')
+        lines += [f'{prefix}_stage_calls_total{{stage="{name}"}} {value}' for name, value in sorted(calls.items())]
+        for name, value in sorted(counters.items()):
+            lines += [f'# TYPE {prefix}_{name}_total counter', f'{prefix}_{name}_total {value}']
+        return '\n'.join(lines) + '\n'
+
+
+def stage(name):
+    """Context manager timing a block into the active Instrumentation, if any"""
+    instrumentation = _active.get()
+    return _NULL_STAGE if instrumentation is None else instrumentation.stage(name)
+
+
+def count(name, n=1):
+    """Add n to a counter of the active Instrumentation, if any"""
+    instrumentation = _active.get()
+    if instrumentation is not None:
+        instrumentation.count(name, n)
+
+
+@contextmanager
+def activate(instrumentation):
+    """Record stages run in this block (in this thread/context) into instrumentation
+
+    activate(None) is a no-op, so callers do not need to branch.
+    """
+    if instrumentation is None:
+        yield None
+        return
+    token = _active.set(instrumentation)
+    try:
+        yield instrumentation
+    finally:
+        _active.reset(token)
+
+
+@contextmanager
+def profiled(path):
+    """cProfile the block and write a pstats dump to path (no-op when path is empty)
+
+    The dump loads with `python -m pstats`, snakeviz, or flameprof for a flame graph.
+    """
+    if not path:
+        yield None
+        return
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
@@ -0,0 +1,600 @@
+#!/usr/bin/env python3
+"""
+ClearHead Local AI - persistent scoring server
+Keeps the model loaded and answers recommendation requests over local HTTP
+or a Unix socket, so each request skips interpreter start and model load.
+The default front end is a thread per connection; --frontend asyncio serves
+every connection from one event loop and scores in a thread or process pool.
+
+  POST /recommend   same task JSON process_clearhead_tasks reads, same result JSON
+  GET  /health      model and server status
+  GET  /metrics     Prometheus text metrics (request latency, batch sizes, reloads)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import queue
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from clearhead_ai import (
+    DEFAULT_MODEL_FILE, MODEL_TYPE, error_result, is_error_result, load_or_train_model,
+    recommend_many
+)
+from clearhead_profile import Instrumentation, activate
+
+
+class ModelHolder:
+    """Owns the loaded analyzer and swaps in a new one when the model file changes"""
+
+    def __init__(self, model_file, check_interval=1.0):
+        self.model_file = model_file
+        self.check_interval = check_interval
+        self.reloads = 0
+        self.reload_errors = 0
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self.analyzer = load_or_train_model(model_file)
+        self._mtime = self._current_mtime()
+        self.loaded_at = time.time()
+
+    def _current_mtime(self):
+        try:
+            return os.stat(self.model_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def get(self):
+        """Return the current analyzer, reloading it first if the model file changed"""
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            mtime = self._current_mtime()
+            if mtime is not None and mtime != self._mtime:
+                self.reload(mtime)
+        return self.analyzer
+
+    def reload(self, mtime=None):
+        """Load the model file into a fresh analyzer; keep serving the old one on failure"""
+        from clearhead_ai import ADHDTaskAnalyzer
+
+        with self._lock:
+            analyzer = ADHDTaskAnalyzer()
+            try:
+                if not analyzer.load_model(self.model_file):
+                    raise FileNotFoundError(self.model_file)
+            except Exception as e:
+                self.reload_errors += 1
+                print(f"❌ Model reload failed, keeping previous model: {e}")
+                return False
+            self.analyzer = analyzer
+            self._mtime = mtime if mtime is not None else self._current_mtime()
+            self.loaded_at = time.time()
+            self.reloads += 1
+            return True
+
+
+class Metrics:
+    """Request counters and a rolling window of request latencies"""
+
+    def __init__(self, window=10_000):
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.batched_tasks = 0
+        self.latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe_request(self, seconds, failed):
+        with self._lock:
+            self.requests += 1
+            self.errors += int(failed)
+            self.latencies.append(seconds)
+
+    def observe_batch(self, n_requests, n_tasks):
+        with self._lock:
+            self.batches += 1
+            self.batched_requests += n_requests
+            self.batched_tasks += n_tasks
+
+    def latency_quantiles(self, quantiles=(0.5, 0.9, 0.99)):
+        with self._lock:
+            values = sorted(self.latencies)
+        if not values:
+            return {q: 0.0 for q in quantiles}
+        return {q: values[min(len(values) - 1, int(q * len(values)))] for q in quantiles}
+
+    def snapshot(self):
+        quantiles = self.latency_quantiles()
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'batches': self.batches,
+            'mean_batch_requests': self.batched_requests / self.batches if self.batches else 0.0,
+            'mean_batch_tasks': self.batched_tasks / self.batches if self.batches else 0.0,
+            'latency_ms': {f'p{int(q * 100)}': seconds * 1000 for q, seconds in quantiles.items()}
+        }
+
+    def prometheus(self, holder, instrumentation=None):
+        lines = [
+            '# TYPE clearhead_requests_total counter',
+            f'clearhead_requests_total {self.requests}',
+            '# TYPE clearhead_request_errors_total counter',
+            f'clearhead_request_errors_total {self.errors}',
+            '# TYPE clearhead_batches_total counter',
+            f'clearhead_batches_total {self.batches}',
+            '# TYPE clearhead_batched_requests_total counter',
+            f'clearhead_batched_requests_total {self.batched_requests}',
+            '# TYPE clearhead_batched_tasks_total counter',
+            f'clearhead_batched_tasks_total {self.batched_tasks}',
+            '# TYPE clearhead_request_latency_seconds summary',
+        ]
+        for q, seconds in self.latency_quantiles().items():
+            lines.append(f'clearhead_request_latency_seconds{{quantile="{q}"}} {seconds:.6f}')
+        lines += [
+            '# TYPE clearhead_model_reloads_total counter',
+            f'clearhead_model_reloads_total {holder.reloads}',
+            '# TYPE clearhead_model_reload_errors_total counter',
+            f'clearhead_model_reload_errors_total {holder.reload_errors}',
+            '# TYPE clearhead_model_loaded_timestamp_seconds gauge',
+            f'clearhead_model_loaded_timestamp_seconds {holder.loaded_at:.3f}',
+        ]
+        text = '\n'.join(lines) + '\n'
+        return text + instrumentation.prometheus() if instrumentation is not None else text
+
+
+class ScoringBatcher:
+    """Coalesces concurrent requests into one recommend_many call
+
+    A single worker thread takes the first waiting request, then keeps collecting
+    until max_batch_tasks tasks are queued or max_wait seconds have passed.
+    Per-stage scoring time accumulates in self.instrumentation.
+    """
+
+    def __init__(self, holder, metrics, max_batch_tasks=2048, max_wait=0.002, max_queue=1024):
+        self.holder = holder
+        self.metrics = metrics
+        self.max_batch_tasks = max_batch_tasks
+        self.max_wait = max_wait
+        self.instrumentation = Instrumentation()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name='clearhead-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, app_data, timeout=30.0):
+        """Score one payload, blocking until its batch has run"""
+        slot = {'payload': app_data, 'done': threading.Event(), 'result': None}
+        self._queue.put(slot, timeout=timeout)
+        if not slot['done'].wait(timeout):
+            raise TimeoutError('Scoring timed out')
+        return slot['result']
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            n_tasks = _task_count(batch[0]['payload'])
+            deadline = time.monotonic() + self.max_wait
+            while n_tasks < self.max_batch_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    slot = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(slot)
+                n_tasks += _task_count(slot['payload'])
+
+            try:
+                with activate(self.instrumentation):
+                    results = recommend_many(self.holder.get(), [slot['payload'] for slot in batch])
+            except Exception as e:
+                results = [error_result(e)] * len(batch)
+
+            self.metrics.observe_batch(len(batch), n_tasks)
+            for slot, result in zip(batch, results):
+                slot['result'] = result
+                slot['done'].set()
+
+
+def _task_count(app_data):
+    tasks = app_data.get('tasks') if isinstance(app_data, dict) else None
+    return len(tasks) if isinstance(tasks, list) else 0
+
+
+class ServerBusy(Exception):
+    """The request queue stayed full; the client should retry later (HTTP 503)"""
+
+
+_worker_holder = None  # ModelHolder of a process-pool scoring worker
+
+
+def _init_scoring_worker(model_file, reload_interval):
+    global _worker_holder
+    _worker_holder = ModelHolder(model_file, check_interval=reload_interval)
+
+
+def _score_batch(payloads, holder=None):
+    """recommend_many with holder's analyzer (default: this worker process's); returns (results, timings)"""
+    instrumentation = Instrumentation()
+    with activate(instrumentation):
+        results = recommend_many((holder or _worker_holder).get(), payloads)
+    return results, instrumentation.as_dict()
+
+
+class AsyncScoringBatcher:
+    """asyncio counterpart of ScoringBatcher
+
+    Requests wait in a bounded queue; submit() raises ServerBusy when the
+    queue stays full for queue_timeout seconds. A collector task takes the
+    waiting requests, up to max_batch_tasks tasks, and hands them to
+    score(payloads) -> (results, timings) in executor, so the event loop
+    never blocks. Up to max_in_flight batches are scored at once, and requests
+    that arrive meanwhile form the next batch: batches grow with load without
+    a fixed wait. max_wait additionally lets a batch linger for company.
+    """
+
+    def __init__(self, score, executor, metrics, max_batch_tasks=2048, max_wait=0.0, max_queue=1024,
+                 max_in_flight=1, queue_timeout=1.0, holder=None):
+        self.score = score
+        self.executor = executor
+        self.metrics = metrics
+        self.max_batch_tasks = max_batch_tasks
+        self.max_wait = max_wait
+        self.queue_timeout = queue_timeout
+        self.holder = holder  # Polled before each batch so /health follows model reloads
+        self.instrumentation = Instrumentation()
+        self.rejected = 0
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._arrived = asyncio.Event()
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._batches = set()  # Running _score_batch tasks (the loop only keeps weak references)
+        self._collector = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, app_data, timeout=30.0):
+        """Score one payload once its batch has run"""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((app_data, future))
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put((app_data, future)), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise ServerBusy('Server busy, try again shortly') from None
+        self._arrived.set()
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError('Scoring timed out') from None
+
+    async def close(self):
+        self._collector.cancel()
+        await asyncio.gather(self._collector, *self._batches, return_exceptions=True)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._in_flight.acquire()
+            batch = [await self._queue.get()]
+            n_tasks = _task_count(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while n_tasks < self.max_batch_tasks:
+                if self._queue.empty():
+                    # Wait on an event rather than the queue: cancelling a queue get can drop an item
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    self._arrived.clear()
+                    try:
+                        await asyncio.wait_for(self._arrived.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                    continue
+                slot = self._queue.get_nowait()
+                batch.append(slot)
+                n_tasks += _task_count(slot[0])
+
+            task = loop.create_task(self._score_batch(batch, n_tasks))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _score_batch(self, batch, n_tasks):
+        try:
+            if self.holder is not None:
+                self.holder.get()
+            results, timings = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.score, [payload for payload, _ in batch])
+            self.instrumentation.merge(timings)
+        except Exception as e:
+            results = [error_result(e)] * len(batch)
+        finally:
+            self._in_flight.release()
+
+        self.metrics.observe_batch(len(batch), n_tasks)
+        for (_, future), result in zip(batch, results):
+            if not future.done():  # Its request may have timed out
+                future.set_result(result)
+
+
+def health_status(holder, metrics, started_at):
+    return {
+        'status': 'ok',
+        'model_file': holder.model_file,
+        'model_type': MODEL_TYPE,
+        'model_loaded_at': holder.loaded_at,
+        'model_reloads': holder.reloads,
+        'uptime_seconds': time.time() - started_at,
+        'metrics': metrics.snapshot()
+    }
+
+
+class RecommendationHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ClearHeadAI'
+
+    def do_POST(self):
+        if self.path != '/recommend':
+            return self._send_json(404, {'success': False, 'message': 'Not found'})
+
+        start = time.perf_counter()
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            app_data = json.loads(self.rfile.read(length))
+            if not isinstance(app_data, dict):
+                raise ValueError('Expected a JSON object with a "tasks" list')
+            result = self.server.batcher.submit(app_data)
+        except Exception as e:
+            result = error_result(e)
+
+        self._send_json(200, result)
+        self.server.metrics.observe_request(time.perf_counter() - start, is_error_result(result))
+
+    def do_GET(self):
+        holder = self.server.holder
+        if self.path == '/health':
+            self._send_json(200, health_status(holder, self.server.metrics, self.server.started_at))
+        elif self.path == '/metrics':
+            body = self.server.metrics.prometheus(holder, self.server.batcher.instrumentation).encode()
+            self._send(200, body, 'text/plain; version=0.0.4')
+        else:
+            self._send_json(404, {'success': False, 'message': 'Not found'})
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload, separators=(',', ':')).encode(), 'application/json')
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Per-request logging would dominate latency; see /metrics instead
+
+
+LISTEN_BACKLOG = 128  # socketserver's default of 5 resets bursts of new connections
+
+
+class TCPHTTPServer(ThreadingHTTPServer):
+    request_queue_size = LISTEN_BACKLOG
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = LISTEN_BACKLOG
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ('unix', 0)
+
+
+def make_server(model_file=DEFAULT_MODEL_FILE, host='127.0.0.1', port=8765, socket_path=None,
+                max_batch_tasks=2048, max_wait=0.002, reload_interval=1.0):
+    """Build a ready-to-run server with the model already loaded"""
+    holder = ModelHolder(model_file, check_interval=reload_interval)
+    metrics = Metrics()
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = UnixHTTPServer(socket_path, RecommendationHandler)
+    else:
+        server = TCPHTTPServer((host, port), RecommendationHandler)
+
+    server.holder = holder
+    server.metrics = metrics
+    server.batcher = ScoringBatcher(holder, metrics, max_batch_tasks=max_batch_tasks, max_wait=max_wait)
+    server.started_at = time.time()
+    return server
+
+
+class AsyncRecommendationServer:
+    """The same endpoints as RecommendationHandler on asyncio streams (HTTP/1.1 keep-alive)"""
+
+    def __init__(self, holder, metrics, batcher):
+        self.holder = holder
+        self.metrics = metrics
+        self.batcher = batcher
+        self.started_at = time.time()
+
+    async def handle(self, reader, writer):
+        """Answer requests on one connection until the client closes it"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                status, body, content_type = await self.respond(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                writer.write(b''.join([
+                    f'HTTP/1.1 {status} {_REASONS[status]}\r\n'.encode(),
+                    f'Server: ClearHeadAI\r\nContent-Type: {content_type}\r\n'.encode(),
+                    f'Content-Length: {len(body)}\r\n'.encode(),
+                    b'' if keep_alive else b'Connection: close\r\n',
+                    b'\r\n', body
+                ]))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass  # Malformed request or client gone: drop the connection
+        finally:
+            writer.close()
+
+    async def respond(self, method, path, body):
+        """(status, body bytes, content type) for one request"""
+        if method == 'POST' and path == '/recommend':
+            start = time.perf_counter()
+            status = 200
+            try:
+                app_data = json.loads(body)
+                if not isinstance(app_data, dict):
+                    raise ValueError('Expected a JSON object with a "tasks" list')
+                result = await self.batcher.submit(app_data)
+            except ServerBusy as e:
+                status, result = 503, error_result(e)
+            except Exception as e:
+                result = error_result(e)
+            self.metrics.observe_request(time.perf_counter() - start, is_error_result(result))
+            return status, _json_bytes(result), 'application/json'
+        if method == 'GET' and path == '/health':
+            status = dict(health_status(self.holder, self.metrics, self.started_at), rejected=self.batcher.rejected)
+            return 200, _json_bytes(status), 'application/json'
+        if method == 'GET' and path == '/metrics':
+            text = self.metrics.prometheus(self.holder, self.batcher.instrumentation)
+            text += f'# TYPE clearhead_rejected_requests_total counter\nclearhead_rejected_requests_total {self.batcher.rejected}\n'
+            return 200, text.encode(), 'text/plain; version=0.0.4'
+        return 404, _json_bytes({'success': False, 'message': 'Not found'}), 'application/json'
+
+
+_REASONS = {200: 'OK', 404: 'Not Found', 503: 'Service Unavailable'}
+
+
+def _json_bytes(payload):
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+
+async def serve_async(model_file=DEFAULT_MODEL_FILE, host='127.0.0.1', port=8765, socket_path=None,
+                      max_batch_tasks=2048, max_wait=0.0, reload_interval=1.0, executor='thread', workers=1,
+                      max_queue=1024, started=None):
+    """Run the asyncio front end until cancelled
+
+    executor is 'thread' (scoring threads share this process's model) or
+    'process' (each worker process loads its own copy). workers is the pool
+    size and the number of batches scored at once. started, if given, is
+    called with the listening asyncio.Server.
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    holder = ModelHolder(model_file, check_interval=reload_interval)  # Also trains a missing model once
+    metrics = Metrics()
+    if executor == 'process':
+        pool = ProcessPoolExecutor(workers, initializer=_init_scoring_worker, initargs=(model_file, reload_interval))
+        score = _score_batch
+        # Start the workers (each loads the model in its initializer) before taking requests
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(pool, score, []) for _ in range(workers)))
+    else:
+        pool = ThreadPoolExecutor(workers, thread_name_prefix='clearhead-score')
+        score = partial(_score_batch, holder=holder)
+    batcher = AsyncScoringBatcher(score, pool, metrics, max_batch_tasks, max_wait, max_queue,
+                                  max_in_flight=workers, holder=holder)
+    front = AsyncRecommendationServer(holder, metrics, batcher)
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = await asyncio.start_unix_server(front.handle, socket_path, backlog=LISTEN_BACKLOG)
+    else:
+        server = await asyncio.start_server(front.handle, host, port, backlog=LISTEN_BACKLOG)
+    try:
+        async with server:
+            if started is not None:
+                started(server)
+            await server.serve_forever()
+    finally:
+        await batcher.close()
+        pool.shutdown(cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ClearHead persistent scoring server')
+    parser.add_argument('--model', default=DEFAULT_MODEL_FILE, help='model file to serve')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--max-batch-tasks', type=int, default=2048,
+                        help='stop collecting a batch once this many tasks are queued')
+    parser.add_argument('--max-wait-ms', type=float,
+                        help='how long the first request of a batch waits for company '
+                             '(default: 2 with threads, 0 with asyncio)')
+    parser.add_argument('--reload-interval', type=float, default=1.0,
+                        help='seconds between model file change checks')
+    parser.add_argument('--frontend', choices=['threads', 'asyncio'], default='threads',
+                        help='thread per connection, or one event loop for all connections')
+    parser.add_argument('--executor', choices=['thread', 'process'], default='thread',
+                        help='asyncio front end: where batches are scored')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='asyncio front end: scoring workers, i.e. batches scored at once')
+    parser.add_argument('--max-queue', type=int, default=1024,
+                        help='asyncio front end: waiting requests before new ones get HTTP 503')
+    args = parser.parse_args(argv)
+
+    if args.max_wait_ms is None:
+        args.max_wait_ms = 0.0 if args.frontend == 'asyncio' else 2.0
+    if args.frontend == 'asyncio':
+        return _main_async(args)
+
+    server = make_server(args.model, args.host, args.port, args.socket,
+                         args.max_batch_tasks, args.max_wait_ms / 1000, args.reload_interval)
+    where = args.socket or f'http://{args.host}:{args.port}'
+    print(f"✅ ClearHead AI server listening on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+    return 0
+
+
+def _main_async(args):
+    where = args.socket or f'http://{args.host}:{args.port}'
+    try:
+        asyncio.run(serve_async(args.model, args.host, args.port, args.socket, args.max_batch_tasks,
+                                args.max_wait_ms / 1000, args.reload_interval, args.executor, args.workers,
+                                args.max_queue,
+                                started=lambda server: print(f"✅ ClearHead AI server (asyncio) listening on {where}",
+                                                             flush=True)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
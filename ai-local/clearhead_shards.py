@@ -0,0 +1,180 @@
+"""
+ClearHead Local AI - labeled rows on disk
+Training data (the generate_adhd_training_data columns plus 'completed')
+stored as partitions: a directory of shards, each a directory of .npy column
+files (memory-mapped when read), a .npz archive such as `clearhead_ai.py
+history --export`, or a .parquet file (needs pyarrow).
+
+featurize_shards() reads the shards once, one at a time, writing their
+feature rows into a memory-mapped .npy matrix and fitting the scaler with
+partial_fit as it goes. sample_index() draws training or held-out rows and
+read_rows() gathers them from that matrix, both one block at a time.
+ADHDTaskAnalyzer.train_out_of_core builds on these, so training memory
+depends on the sample size and not on the size of the data.
+"""
+
+import os
+
+import numpy as np
+
+SHARD_PREFIX = 'shard-'
+FEATURES_FILE = 'features.npy'  # float32 (rows, features)
+LABELS_FILE = 'labels.npy'      # int8 completed
+TEST_FILE = 'test.npy'          # bool, held out for evaluation
+BLOCK_ROWS = 65536  # read_rows maps this many rows at a time
+
+
+def write_shards(chunks, directory):
+    """Save chunks of labeled rows (dicts of columns or DataFrames) as .npy shards; returns the count"""
+    os.makedirs(directory, exist_ok=True)
+    n = 0
+    for n, chunk in enumerate(chunks, 1):
+        shard = os.path.join(directory, f'{SHARD_PREFIX}{n - 1:05d}')
+        os.makedirs(shard, exist_ok=True)
+        for name in chunk.keys():
+            values = np.asarray(chunk[name])
+            np.save(os.path.join(shard, f'{name}.npy'), values.astype(str) if values.dtype == object else values)
+    return n
+
+
+def _is_shard(path):
+    if path.endswith(('.npz', '.parquet')):
+        return os.path.isfile(path)
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, 'completed.npy'))
+
+
+def list_shards(source):
+    """Shard paths of source (a directory of shards, or one shard) in name order"""
+    if _is_shard(source):
+        return [source]
+    if not os.path.isdir(source):
+        raise ValueError(f"No training data at {source}")
+    shards = [path for path in (os.path.join(source, name) for name in sorted(os.listdir(source))) if _is_shard(path)]
+    if not shards:
+        raise ValueError(f"No .npy, .npz or .parquet shards in {source}")
+    return shards
+
+
+def read_shard(path):
+    """Columns of one shard; .npy columns are memory-mapped"""
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path)
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+    return {name[:-4]: np.load(os.path.join(path, name), mmap_mode='r')
+            for name in sorted(os.listdir(path)) if name.endswith('.npy')}
+
+
+def shard_rows(path):
+    """Number of rows in a shard, from its metadata where the format has it"""
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            return len(data['completed'])
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(path).metadata.num_rows
+    return len(np.load(os.path.join(path, 'completed.npy'), mmap_mode='r'))
+
+
+def iter_shards(source):
+    """Yield the columns of every shard; e.g. train_model(iter_shards(path)) for in-memory training"""
+    for path in list_shards(source):
+        yield read_shard(path)
+
+
+def featurize_shards(encode, source, directory, n_features, test_size=0.2, rng=None):
+    """Featurize every shard into FEATURES_FILE, LABELS_FILE and TEST_FILE in directory
+
+    Rows go to the files at their position in the data, and each is held out
+    (TEST_FILE) with probability test_size. Returns (rows, scaler), where the
+    StandardScaler is fitted on the training rows only.
+    """
+    from sklearn.preprocessing import StandardScaler
+
+    rng = np.random.default_rng(rng)
+    shards = list_shards(source)
+    n_rows = sum(shard_rows(path) for path in shards)
+    paths = [os.path.join(directory, name) for name in (FEATURES_FILE, LABELS_FILE, TEST_FILE)]
+    for path, dtype, shape in zip(paths, (np.float32, np.int8, np.bool_), ((n_rows, n_features), (n_rows,), (n_rows,))):
+        # Created at full size and closed; filled one shard's rows at a time below
+        np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape).flush()
+
+    scaler = StandardScaler()
+    offset = 0
+    for path in shards:
+        chunk = read_shard(path)
+        X = encode(chunk)
+        held_out = rng.random(len(X)) < test_size
+        if not held_out.all():
+            scaler.partial_fit(X[~held_out])
+        for file, values in zip(paths, (X, np.asarray(chunk['completed']).astype(np.int8), held_out)):
+            _write_rows(file, offset, values)
+        offset += len(X)
+    if not hasattr(scaler, 'mean_'):
+        raise ValueError("No training rows")
+    return n_rows, scaler
+
+
+def _write_rows(path, offset, values):
+    """Write values at row offset of a .npy file, mapping it only for the write"""
+    out = np.load(path, mmap_mode='r+')
+    out[offset:offset + len(values)] = values
+    out.flush()
+    del out
+
+
+def read_rows(path, index, block_rows=BLOCK_ROWS):
+    """Rows at the sorted, unique index of a .npy file, mapping one block at a time
+
+    Pages of a mapping count as resident until it is closed, so reading a
+    sample spread over the whole file through one mapping would hold all of
+    it; block by block, only the sample and one block are resident.
+    """
+    data = np.load(path, mmap_mode='r')
+    n_rows, shape, dtype = len(data), data.shape[1:], data.dtype
+    del data
+    out = np.empty((len(index),) + shape, dtype=dtype)
+    bounds = np.searchsorted(index, np.arange(0, n_rows + block_rows, block_rows))
+    for block in range(len(bounds) - 1):
+        lo, hi = bounds[block], bounds[block + 1]
+        if lo < hi:
+            data = np.load(path, mmap_mode='r')
+            out[lo:hi] = data[index[lo:hi]]
+            del data
+    return out
+
+
+def sample_index(path, size, value, rng, block_rows=BLOCK_ROWS):
+    """Sorted indices of up to size random rows (no repeats) whose entry in a .npy vector equals value
+
+    How many rows each block contributes is drawn from the hypergeometric
+    distribution, so the sample is uniform while only one block of the
+    vector and the sample itself are held.
+    """
+    data = np.load(path, mmap_mode='r')
+    starts = range(0, len(data), block_rows)
+    del data
+    counts = [int(np.count_nonzero(_block(path, start, block_rows) == value)) for start in starts]
+    remaining = sum(counts)
+    size = min(size, remaining)
+    picked = []
+    for start, count in zip(starts, counts):
+        take = int(rng.hypergeometric(count, remaining - count, size))
+        if take:
+            rows = np.flatnonzero(_block(path, start, block_rows) == value) + start
+            picked.append(np.sort(rng.choice(rows, take, replace=False)))
+        remaining -= count
+        size -= take
+    return np.concatenate(picked) if picked else np.empty(0, dtype=np.int64)
+
+
+def _block(path, start, block_rows):
+    data = np.load(path, mmap_mode='r')
+    block = np.array(data[start:start + block_rows])
+    del data
+    return block
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+ClearHead Local AI - forest hyperparameter search
+Successive halving over forest size and depth with k-fold cross-validation in
+a process pool. Workers read the feature matrix from shared memory instead of
+getting a copy each. Configurations that reach full data are compared on AUC,
+compiled inference latency and artifact size, and the smallest forest within
+--tolerance of the best AUC is picked.
+
+  python clearhead_tune.py
+  python clearhead_tune.py --workers 8 --output tuning.json
+  python clearhead_tune.py --save clearhead_model
+"""
+
+import argparse
+import itertools
+import math
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+import numpy as np
+
+from clearhead_ai import ADHDTaskAnalyzer, FOREST_PARAMS
+from clearhead_io import write_json_atomic
+
+N_ESTIMATORS = [10, 25, 50, 100, 200]
+MAX_DEPTHS = [4, 6, 8, 12, None]  # None grows trees until min_samples_leaf stops them
+MIN_SAMPLES_LEAF = [2]
+LATENCY_ROWS = 20  # a typical request
+LATENCY_REPEAT = 200
+
+_shared = None  # Per-worker {'X', 'y', 'fold'} arrays, attached by _init_worker
+_blocks = None  # The SharedMemory blocks behind _shared, kept open while it is used
+
+
+def candidate_grid(n_estimators=N_ESTIMATORS, max_depths=MAX_DEPTHS, min_samples_leaf=MIN_SAMPLES_LEAF):
+    return [dict(FOREST_PARAMS, n_estimators=n, max_depth=depth, min_samples_leaf=leaf)
+            for n, depth, leaf in itertools.product(n_estimators, max_depths, min_samples_leaf)]
+
+
+def rung_budgets(n_candidates, n_train, eta=3, min_budget=500):
+    """Training rows per successive-halving rung, ending with all n_train rows"""
+    n_rungs = 1 + max(0, math.ceil(math.log(max(n_candidates, 1), eta)) - 1)
+    budgets = [n_train]
+    while len(budgets) < n_rungs and budgets[-1] // eta >= min_budget:
+        budgets.append(budgets[-1] // eta)
+    return budgets[::-1]
+
+
+def share_arrays(arrays):
+    """Copy arrays into new shared memory blocks; returns (blocks, specs for attach_arrays)"""
+    from multiprocessing import shared_memory
+
+    blocks, specs = [], {}
+    for name, array in arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+
+def attach_arrays(specs):
+    """Read-only views of the blocks created by share_arrays; returns (blocks, arrays)"""
+    from multiprocessing import shared_memory
+
+    blocks, arrays = [], {}
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        array = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+        array.flags.writeable = False
+        blocks.append(block)
+        arrays[name] = array
+    return blocks, arrays
+
+
+def _init_worker(specs):
+    global _shared, _blocks
+    _blocks, _shared = attach_arrays(specs)
+
+
+def evaluate(params, budget, fold, keep_forest=False, arrays=None):
+    """Fit params on up to budget training rows outside fold and score the fold
+
+    Returns AUC, fit time and compiled size; with keep_forest, also the
+    CompiledForest so the caller can time it.
+    """
+    from sklearn.metrics import roc_auc_score
+
+    from clearhead_forest import compile_forest
+
+    arrays = arrays or _shared
+    X, y, folds = arrays['X'], arrays['y'], arrays['fold']
+    train = np.flatnonzero(folds != fold)[:budget]  # Rows are pre-shuffled, so a prefix is a random sample
+    test = np.flatnonzero(folds == fold)
+
+    analyzer = ADHDTaskAnalyzer()
+    analyzer.forest_params = dict(params)
+    model = analyzer._new_forest(params['n_estimators'], n_jobs=1, random_state=fold)
+    start = time.perf_counter()
+    model.fit(X[train], y[train])
+    fit_seconds = time.perf_counter() - start
+
+    forest = compile_forest(model)
+    result = {
+        'auc': float(roc_auc_score(y[test], forest.predict(X[test]))),
+        'fit_seconds': fit_seconds,
+        'n_nodes': forest.n_nodes,
+        'bytes': forest.nbytes
+    }
+    if keep_forest:
+        result['forest'] = forest
+    return result
+
+
+def inference_latency(forest, X, rows=LATENCY_ROWS, repeat=LATENCY_REPEAT):
+    """Median seconds for one compiled-forest prediction of `rows` rows"""
+    block = np.ascontiguousarray(X[:rows])
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        forest.predict(block)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def pareto_front(rows, maximize=('auc',), minimize=('latency_seconds', 'bytes')):
+    """Rows not dominated by another row on all objectives"""
+    def dominates(a, b):
+        no_worse = (all(a[k] >= b[k] for k in maximize) and all(a[k] <= b[k] for k in minimize))
+        better = (any(a[k] > b[k] for k in maximize) or any(a[k] < b[k] for k in minimize))
+        return no_worse and better
+
+    return [row for row in rows if not any(dominates(other, row) for other in rows)]
+
+
+def pick_model(rows, tolerance=0.01):
+    """The smallest forest whose AUC is within tolerance (relative) of the best"""
+    best = max(row['auc'] for row in rows)
+    eligible = [row for row in rows if row['auc'] >= best * (1 - tolerance)]
+    return min(eligible, key=lambda row: (row['bytes'], row['latency_seconds']))
+
+
+def _survivors(rows, eta, tolerance):
+    """Top 1/eta by AUC, plus near-best configurations that are the smallest at their AUC
+
+    Small forests often trail slightly at low budgets; keeping the ones within
+    tolerance of the best that no other near-best config beats on size lets
+    them reach full data.
+    """
+    ranked = sorted(rows, key=lambda row: -row['auc'])
+    keep = ranked[:max(1, math.ceil(len(rows) / eta))]
+    best = ranked[0]['auc']
+    near_best = [row for row in rows if row['auc'] >= best * (1 - tolerance)]
+    keep += [row for row in pareto_front(near_best, minimize=('bytes',)) if row not in keep]
+    return keep
+
+
+def successive_halving(arrays, candidates, cv=3, eta=3, min_budget=500, tolerance=0.01, workers=1):
+    """Run the search; returns (rungs, final) where final rows carry latency too"""
+    n_train = int(np.sum(arrays['fold'] != 0))
+    budgets = rung_budgets(len(candidates), n_train, eta, min_budget)
+    pool = blocks = None
+    if workers > 1:
+        import multiprocessing
+
+        blocks, specs = share_arrays(arrays)
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(specs,))
+
+    rungs, forests = [], {}
+    try:
+        for rung, budget in enumerate(budgets):
+            last = rung == len(budgets) - 1
+            start = time.perf_counter()
+            jobs = [(i, fold, (params, budget, fold, last and fold == 0))
+                    for i, params in enumerate(candidates) for fold in range(cv)]
+            if pool is None:
+                done = [(i, fold, evaluate(*job, arrays=arrays)) for i, fold, job in jobs]
+            else:
+                pending = [(i, fold, pool.apply_async(evaluate, job)) for i, fold, job in jobs]
+                done = [(i, fold, result.get()) for i, fold, result in pending]
+
+            rows = []
+            for i, params in enumerate(candidates):
+                folds = [result for j, _, result in done if j == i]
+                aucs = [result['auc'] for result in folds]
+                rows.append({
+                    'params': params,
+                    'auc': float(np.mean(aucs)),
+                    'auc_std': float(np.std(aucs)),
+                    'fit_seconds': float(np.mean([result['fit_seconds'] for result in folds])),
+                    'n_nodes': int(np.mean([result['n_nodes'] for result in folds])),
+                    'bytes': int(np.mean([result['bytes'] for result in folds]))
+                })
+                if last:
+                    forests[i] = next(result['forest'] for result in folds if 'forest' in result)
+
+            rungs.append({'budget': budget, 'candidates': len(candidates), 'seconds': time.perf_counter() - start,
+                          'results': rows})
+            print(f"Rung {rung + 1}/{len(budgets)}: {len(candidates)} configs x {cv} folds "
+                  f"on {budget} rows in {rungs[-1]['seconds']:.1f}s", file=sys.stderr)
+            if not last:
+                kept = _survivors(rows, eta, tolerance)
+                candidates = [row['params'] for row in kept]
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        for block in blocks or ():
+            block.close()
+            block.unlink()
+
+    # Latency is timed here, one forest at a time, so parallel fits do not skew it
+    final = rungs[-1]['results']
+    for i, row in enumerate(final):
+        row['latency_seconds'] = inference_latency(forests[i], arrays['X'])
+    return rungs, final
+
+
+def tuning_data(n_samples, cv=3, seed=42):
+    """Shuffled features, labels and stratified fold ids for n_samples generated rows"""
+    from sklearn.model_selection import StratifiedKFold
+
+    analyzer = ADHDTaskAnalyzer()
+    df = analyzer.generate_adhd_training_data(n_samples, rng=seed)
+    order = np.random.default_rng(seed).permutation(len(df))
+    df = df.iloc[order].reset_index(drop=True)
+    X = analyzer.encode_features(df)
+    y = df['completed'].to_numpy().astype(np.int8)
+    fold = np.empty(len(df), dtype=np.int8)
+    for i, (_, test) in enumerate(StratifiedKFold(cv, shuffle=True, random_state=seed).split(X, y)):
+        fold[test] = i
+    return df, {'X': X, 'y': y, 'fold': fold}
+
+
+def format_params(params):
+    depth = 'none' if params['max_depth'] is None else params['max_depth']
+    return f"trees={params['n_estimators']:<4} depth={depth:<4} leaf={params['min_samples_leaf']:<2}"
+
+
+def print_report(final, front, chosen):
+    print(f"{'configuration':<33} {'AUC':>14} {'latency':>11} {'size':>10} {'nodes':>8}")
+    for row in sorted(final, key=lambda row: -row['auc']):
+        mark = '*' if row is chosen else 'P' if row in front else ' '
+        print(f"{mark} {format_params(row['params']):<31} {row['auc']:.4f}±{row['auc_std']:.4f} "
+              f"{row['latency_seconds'] * 1e6:>9.0f}us {row['bytes'] / 1024:>8.0f}KB {row['n_nodes']:>8}")
+    print(f"P: Pareto front (AUC, {LATENCY_ROWS}-task latency, size)   *: chosen")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Search forest size/depth for the smallest accurate model')
+    parser.add_argument('--samples', type=int, default=20000, help='generated training rows')
+    parser.add_argument('--cv', type=int, default=3, help='cross-validation folds')
+    parser.add_argument('--eta', type=int, default=3, help='keep 1/eta of the configs per rung')
+    parser.add_argument('--min-budget', type=int, default=500, help='training rows in the first rung')
+    parser.add_argument('--n-estimators', type=int, nargs='+', default=N_ESTIMATORS)
+    parser.add_argument('--max-depth', type=lambda value: None if value == 'none' else int(value), nargs='+',
+                        default=MAX_DEPTHS, help="tree depths to try ('none' for unlimited)")
+    parser.add_argument('--min-samples-leaf', type=int, nargs='+', default=MIN_SAMPLES_LEAF)
+    parser.add_argument('--tolerance', type=float, default=0.01,
+                        help='pick the smallest forest with AUC within this fraction of the best')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the full report (every rung) to this JSON file')
+    parser.add_argument('--save', metavar='MODEL',
+                        help='train the chosen configuration on the tuning rows (20%% held out for its '
+                             'test metrics) and save it')
+    args = parser.parse_args(argv)
+
+    df, arrays = tuning_data(args.samples, args.cv, args.seed)
+    candidates = candidate_grid(args.n_estimators, args.max_depth, args.min_samples_leaf)
+    start = time.perf_counter()
+    rungs, final = successive_halving(arrays, candidates, args.cv, args.eta, args.min_budget,
+                                      args.tolerance, args.workers)
+    front = pareto_front(final)
+    chosen = pick_model(final, args.tolerance)
+    print_report(final, front, chosen)
+    print(f"✅ Tuned {len(candidates)} configurations in {time.perf_counter() - start:.1f}s; "
+          f"chosen: {format_params(chosen['params'])}")
+
+    if args.output:
+        write_json_atomic(args.output, {
+            'samples': args.samples, 'cv': args.cv, 'eta': args.eta, 'tolerance': args.tolerance,
+            'rungs': rungs, 'final': final, 'pareto_front': front, 'chosen': chosen
+        })
+    if args.save:
+        analyzer = ADHDTaskAnalyzer()
+        with redirect_stdout(sys.stderr):
+            analyzer.train_model(df, params=chosen['params'])
+            analyzer.save_model(args.save)
+        print(f"✅ Saved {format_params(chosen['params'])} to {args.save}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())